@@ -1,8 +1,10 @@
-from flask import Flask, request, render_template_string, url_for
+from flask import Flask, Response, request, render_template_string, stream_with_context, url_for
 import io
 import base64
+import json
+import queue
+import threading
 import matplotlib.pyplot as plt
-import pandas as pd
 import subprocess
 import os
 
@@ -11,295 +13,326 @@ if not os.path.exists("probability_matrix_women_likes_men.csv"):
     subprocess.run(["python", "init.py"], check=True)
 
 import numpy as np 
-from backend import run_dating_simulation, all_men_ids, all_women_ids, all_user_ids
+from backend import run_dating_simulation, SimulationCancelled
+from sharding import run_sharded_simulation
 
 app = Flask(__name__)
 
+# Seconds between SSE keep-alive comments; also bounds how long a disconnected
+# client can go unnoticed while a simulation day is still running.
+SSE_KEEPALIVE_SECONDS = 5
+
+# Profile attributes offered for splitting the population into independent sub-markets.
+SHARD_ATTRIBUTES = ["Education", "Dating Intentions", "Drinking Habits"]
+
+# Size of the process pool that sharded runs share across requests (per web worker).
+# Every pool process holds its own copy of backend's data (~100 MB), so keep it small
+# on memory-limited hosts.
+SHARD_POOL_WORKERS = int(os.environ.get("SHARD_POOL_WORKERS", "2"))
+
+def parse_simulation_params(values):
+    """Parse simulation parameters from a form or query-string mapping (raises ValueError)."""
+    return {
+        "daily_queue_size": int(values.get("daily_queue_size", 5)),
+        "weight_reciprocal": float(values.get("weight_reciprocal", 1.0)),
+        "weight_queue_penalty": float(values.get("weight_queue_penalty", 0.5)),
+        "export_trace": values.get("export_trace") == "off",
+        "export_jack_jill_trace": values.get("export_jack_jill_trace") == "off",
+        "show_match_plots": values.get("show_match_plots") == "on",
+        "show_like_plots": values.get("show_like_plots") == "on",
+        "plot_type": values.get("plot_type", "Bar Chart")
+    }
+
+def parse_shard_by(values):
+    """The requested sub-market attribute, or None for a single market (raises ValueError)."""
+    shard_by = values.get("shard_by") or None
+    if shard_by is not None and shard_by not in SHARD_ATTRIBUTES:
+        raise ValueError(f"unknown market partition {shard_by!r}")
+    return shard_by
+
+def simulate(params, shard_by=None, progress_callback=None, cancel_check=None):
+    """
+    Run the simulation and return its aggregate counters. With shard_by, the sub-markets
+    run in the shared pool of SHARD_POOL_WORKERS processes and the merged counters are
+    returned; progress_callback then fires once per finished sub-market. cancel_check is
+    polled while the run is in progress (every few dozen logins when unsharded).
+    """
+    if shard_by is not None:
+        return run_sharded_simulation(
+            by=shard_by, workers=SHARD_POOL_WORKERS,
+            progress_callback=progress_callback, cancel_check=cancel_check, **params
+        )
+    return run_dating_simulation(
+        record="aggregate", progress_callback=progress_callback, cancel_check=cancel_check, **params
+    )
+
+def build_results(counters, weight_reciprocal, weight_queue_penalty,
+                  show_match_plots, show_like_plots, plot_type):
+    """
+    Build the summary HTML and the (base64 SVG) plot image from the per-user counters
+    returned by run_dating_simulation(record="aggregate").
+    """
+    user_ids = counters["user_ids"]
+    is_man = np.array([uid.startswith("M") for uid in user_ids])
+    is_woman = np.array([uid.startswith("W") for uid in user_ids])
+
+    likes_by_men = int(counters["likes_sent"][is_man].sum())
+    likes_by_women = int(counters["likes_sent"][is_woman].sum())
+    total_likes = likes_by_men + likes_by_women
+    unique_matches = int(counters["matches"][is_man].sum())
+
+    # ----- NEW METRICS: Unseen & Stale Unseen Likes -----
+    # Unseen likes: count of likes that were never seen by the recipient (still pending).
+    unseen_likes_men = int(counters["unseen_likes_sent"][is_man].sum())
+    unseen_likes_women = int(counters["unseen_likes_sent"][is_woman].sum())
+    total_unseen = unseen_likes_men + unseen_likes_women
+
+    # Stale Unseen likes: count of unseen likes that were not sent on the final day.
+    stale_likes_men = int(counters["stale_likes_sent"][is_man].sum())
+    stale_likes_women = int(counters["stale_likes_sent"][is_woman].sum())
+    total_stale = stale_likes_men + stale_likes_women
+
+    # Compute percentages for unseen and stale unseen likes (of total likes sent)
+    unseen_percent = (total_unseen / total_likes * 100) if total_likes > 0 else 0
+    stale_percent = (total_stale / total_likes * 100) if total_likes > 0 else 0
+
+    # ----- NEW METRICS: Profile views and counts of users with at least one match -----
+    profile_views_men = int(counters["views"][is_man].sum())
+    profile_views_women = int(counters["views"][is_woman].sum())
+    profile_views_total = profile_views_men + profile_views_women
+    men_with_matches = int((counters["matches"][is_man] > 0).sum())
+    women_with_matches = int((counters["matches"][is_woman] > 0).sum())
+
+    # Prepare summary HTML with new content and structure.
+    summary_html = f"""
+    <div style='font-size:14px; line-height:1.5;'>
+      <b>=== Tinder-Style Simulation Results with w<sub>reciprocal</sub>={weight_reciprocal} and w<sub>queue</sub>={weight_queue_penalty} ===</b><br>
+      <br>
+      <b># of Profile Views:</b> {profile_views_total}<br>
+      <div style="margin-left:20px;">
+      - By men: {profile_views_men}<br>
+      - By women: {profile_views_women}
+      </div><br>
+      <b># of Likes Sent:</b> {total_likes}<br>
+      <div style="margin-left:20px;">
+      - By men: {likes_by_men}<br>
+      - By women: {likes_by_women}
+      </div><br>
+      <b># of Unseen Likes Sent:</b> {total_unseen} ({unseen_percent:.2f}% of likes sent)<br>
+      <div style="margin-left:20px;">
+      - By men: {unseen_likes_men}<br>
+      - By women: {unseen_likes_women}
+      </div><br>
+      <b># of Stale Unseen Likes Sent:</b> {total_stale} ({stale_percent:.2f}% of likes sent)<br>
+      <div style="margin-left:20px;">
+      - By men: {stale_likes_men}<br>
+      - By women: {stale_likes_women}
+      </div><br>
+      <b># of Matches Created:</b> <span style="color:purple; font-size:20px;">{unique_matches}</span><br>
+      <div style="margin-left:20px;">
+      - # of men who receive at least one match: {men_with_matches}<br>
+      - # of women who receive at least one match: {women_with_matches}
+      </div>
+    </div>
+    """
+
+    # Generate plots
+    plot_img = None
+    if show_match_plots or show_like_plots:
+        fig, axes = plt.subplots(nrows=3, ncols=2, figsize=(14,15))
+
+        # For bar chart plots, we want to sort individuals by match count for consistency.
+        # Entries are (uid, match count, likes sent, likes received).
+        per_user = list(zip(user_ids, counters["matches"].tolist(),
+                            counters["likes_sent"].tolist(), counters["likes_received"].tolist()))
+        men_matches = sorted([x for x in per_user if x[0].startswith("M")], key=lambda x: x[1])
+        women_matches = sorted([x for x in per_user if x[0].startswith("W")], key=lambda x: x[1])
+
+        # Likes sent and received, in the same (match-sorted) order
+        men_likes_sent = [x[2] for x in men_matches]
+        women_likes_sent = [x[2] for x in women_matches]
+        men_likes_received = [x[3] for x in men_matches]
+        women_likes_received = [x[3] for x in women_matches]
+
+        if plot_type == "Bar Chart":
+          # Match plots - Bar Chart
+          if show_match_plots:
+              axes[0,0].bar(range(len(men_matches)), [x[1] for x in men_matches],
+                          color="skyblue", edgecolor="black")
+              axes[0,0].set_title("Men's Match Counts (Sorted)")
+              axes[0,0].set_xlabel("Men (sorted by match count)")
+              axes[0,0].set_ylabel("Number of Matches")
+
+              axes[0,1].bar(range(len(women_matches)), [x[1] for x in women_matches],
+                          color="lightpink", edgecolor="black")
+              axes[0,1].set_title("Women's Match Counts (Sorted)")
+              axes[0,1].set_xlabel("Women (sorted by match count)")
+              axes[0,1].set_ylabel("Number of Matches")
+          else:
+              axes[0,0].axis('off')
+              axes[0,1].axis('off')
+
+          # Like plots - Likes Sent (Bar Chart)
+          if show_like_plots:
+              axes[1,0].bar(range(len(men_matches)), men_likes_sent,
+                          color="skyblue", edgecolor="black")
+              axes[1,0].set_title("Men's Likes Sent (Sorted by Match Count)")
+              axes[1,0].set_xlabel("Men (sorted by match count)")
+              axes[1,0].set_ylabel("Number of Likes Sent")
+
+              axes[1,1].bar(range(len(women_matches)), women_likes_sent,
+                          color="lightpink", edgecolor="black")
+              axes[1,1].set_title("Women's Likes Sent (Sorted by Match Count)")
+              axes[1,1].set_xlabel("Women (sorted by match count)")
+              axes[1,1].set_ylabel("Number of Likes Sent")
+          else:
+              axes[1,0].axis('off')
+              axes[1,1].axis('off')
+
+          # Likes Received plots - Bar Chart
+          if show_like_plots:
+              axes[2,0].bar(range(len(men_matches)), men_likes_received,
+                          color="skyblue", edgecolor="black")
+              axes[2,0].set_title("Men's Likes Received (Sorted by Match Count)")
+              axes[2,0].set_xlabel("Men (sorted by match count)")
+              axes[2,0].set_ylabel("Number of Likes Received")
+
+              axes[2,1].bar(range(len(women_matches)), women_likes_received,
+                          color="lightpink", edgecolor="black")
+              axes[2,1].set_title("Women's Likes Received (Sorted by Match Count)")
+              axes[2,1].set_xlabel("Women (sorted by match count)")
+              axes[2,1].set_ylabel("Number of Likes Received")
+          else:
+              axes[2,0].axis('off')
+              axes[2,1].axis('off')
+
+        elif plot_type == "Histogram":
+          # Fixed bin labels for histogram plots.
+          bin_labels = ["0", "1-3", "4-7", "8+"]
+          # Function to compute histogram counts for fixed bins:
+          # - Count exactly 0, counts between 1 and 2, between 3 and 4, and 5 or more.
+          def compute_hist_counts(data):
+              data = np.array(data)
+              bin0 = np.sum(data == 0)
+              bin1 = np.sum((data >= 1) & (data <= 3))
+              bin2 = np.sum((data >= 4) & (data <= 7))
+              bin3 = np.sum(data >= 8)
+              return [bin0, bin1, bin2, bin3]
+
+          # Compute histogram counts for matches and likes.
+          men_match_data = [x[1] for x in men_matches]
+          women_match_data = [x[1] for x in women_matches]
+          men_match_hist = compute_hist_counts(men_match_data)
+          women_match_hist = compute_hist_counts(women_match_data)
+          men_likes_hist = compute_hist_counts(men_likes_sent)
+          women_likes_hist = compute_hist_counts(women_likes_sent)
+          men_likes_received_hist = compute_hist_counts(men_likes_received)
+          women_likes_received_hist = compute_hist_counts(women_likes_received)
+
+          # Men's match histogram
+          if show_match_plots:
+              axes[0,0].bar(range(len(men_match_hist)), men_match_hist,
+                            color="skyblue", edgecolor="black", width=0.8)
+              axes[0,0].set_title("Histogram of Men's Match Counts")
+              axes[0,0].set_xlabel("Match Count Bins")
+              axes[0,0].set_ylabel("Number of Men")
+              axes[0,0].set_xticks(range(len(bin_labels)))
+              axes[0,0].set_xticklabels(bin_labels)
+          else:
+              axes[0,0].axis('off')
+
+          # Women's match histogram
+          if show_match_plots:
+              axes[0,1].bar(range(len(women_match_hist)), women_match_hist,
+                            color="lightpink", edgecolor="black", width=0.8)
+              axes[0,1].set_title("Histogram of Women's Match Counts")
+              axes[0,1].set_xlabel("Match Count Bins")
+              axes[0,1].set_ylabel("Number of Women")
+              axes[0,1].set_xticks(range(len(bin_labels)))
+              axes[0,1].set_xticklabels(bin_labels)
+          else:
+              axes[0,1].axis('off')
+
+          # Men's likes sent histogram
+          if show_like_plots:
+              axes[1,0].bar(range(len(men_likes_hist)), men_likes_hist,
+                            color="skyblue", edgecolor="black", width=0.8)
+              axes[1,0].set_title("Histogram of Men's Likes Sent")
+              axes[1,0].set_xlabel("Likes Sent Count Bins")
+              axes[1,0].set_ylabel("Number of Men")
+              axes[1,0].set_xticks(range(len(bin_labels)))
+              axes[1,0].set_xticklabels(bin_labels)
+          else:
+              axes[1,0].axis('off')
+
+          # Women's likes sent histogram
+          if show_like_plots:
+              axes[1,1].bar(range(len(women_likes_hist)), women_likes_hist,
+                            color="lightpink", edgecolor="black", width=0.8)
+              axes[1,1].set_title("Histogram of Women's Likes Sent")
+              axes[1,1].set_xlabel("Likes Sent Count Bins")
+              axes[1,1].set_ylabel("Number of Women")
+              axes[1,1].set_xticks(range(len(bin_labels)))
+              axes[1,1].set_xticklabels(bin_labels)
+          else:
+              axes[1,1].axis('off')
+
+          # Men's likes received histogram
+          if show_like_plots:
+              axes[2,0].bar(range(len(men_likes_received_hist)), men_likes_received_hist,
+                            color="skyblue", edgecolor="black", width=0.8)
+              axes[2,0].set_title("Histogram of Men's Likes Received")
+              axes[2,0].set_xlabel("Likes Received Count Bins")
+              axes[2,0].set_ylabel("Number of Men")
+              axes[2,0].set_xticks(range(len(bin_labels)))
+              axes[2,0].set_xticklabels(bin_labels)
+          else:
+              axes[2,0].axis('off')
+
+          # Women's likes received histogram
+          if show_like_plots:
+              axes[2,1].bar(range(len(women_likes_received_hist)), women_likes_received_hist,
+                            color="lightpink", edgecolor="black", width=0.8)
+              axes[2,1].set_title("Histogram of Women's Likes Received")
+              axes[2,1].set_xlabel("Likes Received Count Bins")
+              axes[2,1].set_ylabel("Number of Women")
+              axes[2,1].set_xticks(range(len(bin_labels)))
+              axes[2,1].set_xticklabels(bin_labels)
+          else:
+              axes[2,1].axis('off')
+
+        plt.tight_layout()
+
+        buf = io.BytesIO()
+        plt.savefig(buf, format="svg")
+        buf.seek(0)
+        plot_img = base64.b64encode(buf.getvalue()).decode("utf8")
+        plt.close(fig)
+    return summary_html, plot_img
+
+
 @app.route("/", methods=["GET", "POST"])
 def index():
     if request.method == "POST":
         # Parse parameters from the form
         try:
-            daily_queue_size = int(request.form.get("daily_queue_size", 5))
-            weight_reciprocal = float(request.form.get("weight_reciprocal", 1.0))
-            weight_queue_penalty = float(request.form.get("weight_queue_penalty", 0.5))
-            export_trace = request.form.get("export_trace") == "off"
-            export_jack_jill_trace = request.form.get("export_jack_jill_trace") == "off"
-            show_match_plots = request.form.get("show_match_plots") == "on"
-            show_like_plots = request.form.get("show_like_plots") == "on"
-            plot_type = request.form.get("plot_type", "Bar Chart")
+            params = parse_simulation_params(request.form)
+            shard_by = parse_shard_by(request.form)
         except ValueError:
             return "Invalid parameter(s) provided.", 400
+        weight_reciprocal = params["weight_reciprocal"]
+        weight_queue_penalty = params["weight_queue_penalty"]
+        show_match_plots = params["show_match_plots"]
+        show_like_plots = params["show_like_plots"]
+        plot_type = params["plot_type"]
 
-        # Run the simulation
-        daily_logs, matches, incoming_likes = run_dating_simulation(
-            daily_queue_size=daily_queue_size,
-            weight_reciprocal=weight_reciprocal,
-            weight_queue_penalty=weight_queue_penalty,
-            export_trace=export_trace,
-            export_jack_jill_trace=export_jack_jill_trace,
-            show_match_plots=show_match_plots,
-            show_like_plots=show_like_plots,
-            plot_type=plot_type
-        )
+        # Run the simulation (headline counters only; no per-swipe log is needed here)
+        counters = simulate(params, shard_by)
 
-        full_log = pd.concat(daily_logs, ignore_index=True)
-        likes_by_men = full_log[(full_log["UserID"].str.startswith("M")) & (full_log["Decision"]=="Like")].shape[0]
-        likes_by_women = full_log[(full_log["UserID"].str.startswith("W")) & (full_log["Decision"]=="Like")].shape[0]
-        total_likes = likes_by_men + likes_by_women
-        unique_matches = sum(len(matches[uid]) for uid in all_men_ids)
-    
-        # ----- NEW METRICS: Unseen & Stale Unseen Likes -----
-        # Unseen likes: count of likes that were never seen by the recipient (still pending).
-        unseen_likes_men = 0
-        unseen_likes_women = 0
-        for uid in all_user_ids:
-            for sender, sent_day in incoming_likes[uid]:
-                if sender.startswith("M"):
-                    unseen_likes_men += 1
-                elif sender.startswith("W"):
-                    unseen_likes_women += 1
-        total_unseen = unseen_likes_men + unseen_likes_women
-        
-        # Stale Unseen likes: count of unseen likes that were not sent on day 3.
-        stale_likes_men = 0
-        stale_likes_women = 0
-        for uid in all_user_ids:
-            for sender, sent_day in incoming_likes[uid]:
-                if sent_day != 3:
-                    if sender.startswith("M"):
-                        stale_likes_men += 1
-                    elif sender.startswith("W"):
-                        stale_likes_women += 1
-        total_stale = stale_likes_men + stale_likes_women
-        
-        # Compute percentages for unseen and stale unseen likes (of total likes sent)
-        unseen_percent = (total_unseen / total_likes * 100) if total_likes > 0 else 0
-        stale_percent = (total_stale / total_likes * 100) if total_likes > 0 else 0
-
-        # ----- NEW METRICS: Profile views and counts of users with at least one match -----
-        profile_views_total = full_log.shape[0]
-        profile_views_men = full_log[full_log["UserID"].str.startswith("M")].shape[0]
-        profile_views_women = full_log[full_log["UserID"].str.startswith("W")].shape[0]
-        men_with_matches = sum(1 for uid in all_men_ids if len(matches[uid]) > 0)
-        women_with_matches = sum(1 for uid in all_women_ids if len(matches[uid]) > 0)
-
-        # Prepare summary HTML with new content and structure.
-        summary_html = f"""
-        <div style='font-size:14px; line-height:1.5;'>
-          <b>=== Tinder-Style Simulation Results with w<sub>reciprocal</sub>={weight_reciprocal} and w<sub>queue</sub>={weight_queue_penalty} ===</b><br>
-          <br>
-          <b># of Profile Views:</b> {profile_views_total}<br>
-          <div style="margin-left:20px;">
-          - By men: {profile_views_men}<br>
-          - By women: {profile_views_women}
-          </div><br>
-          <b># of Likes Sent:</b> {total_likes}<br>
-          <div style="margin-left:20px;">
-          - By men: {likes_by_men}<br>
-          - By women: {likes_by_women}
-          </div><br>
-          <b># of Unseen Likes Sent:</b> {total_unseen} ({unseen_percent:.2f}% of likes sent)<br>
-          <div style="margin-left:20px;">
-          - By men: {unseen_likes_men}<br>
-          - By women: {unseen_likes_women}
-          </div><br>
-          <b># of Stale Unseen Likes Sent:</b> {total_stale} ({stale_percent:.2f}% of likes sent)<br>
-          <div style="margin-left:20px;">
-          - By men: {stale_likes_men}<br>
-          - By women: {stale_likes_women}
-          </div><br>
-          <b># of Matches Created:</b> <span style="color:purple; font-size:20px;">{unique_matches}</span><br>
-          <div style="margin-left:20px;">
-          - # of men who receive at least one match: {men_with_matches}<br>
-          - # of women who receive at least one match: {women_with_matches}
-          </div>
-        </div>
-        """
-
-        # Generate plots
-        plot_img = None
-        if show_match_plots or show_like_plots:
-            fig, axes = plt.subplots(nrows=3, ncols=2, figsize=(14,15))
-
-            # For bar chart plots, we want to sort individuals by match count for consistency.
-            men_matches = sorted([(uid, len(matches[uid])) for uid in all_men_ids], key=lambda x: x[1])
-            women_matches = sorted([(uid, len(matches[uid])) for uid in all_women_ids], key=lambda x: x[1])
-            
-            # Prepare likes sent counts using full_log
-            men_likes_sent = []
-            for uid, _ in men_matches:
-                count = full_log[(full_log["UserID"]==uid) & (full_log["Decision"]=="Like")].shape[0]
-                men_likes_sent.append(count)
-            women_likes_sent = []
-            for uid, _ in women_matches:
-                count = full_log[(full_log["UserID"]==uid) & (full_log["Decision"]=="Like")].shape[0]
-                women_likes_sent.append(count)
-            
-            # Prepare likes received counts using full_log (sorted by match count)
-            men_likes_received = []
-            for uid, _ in men_matches:
-                count = full_log[(full_log["CandidateID"]==uid) & (full_log["Decision"]=="Like")].shape[0]
-                men_likes_received.append(count)
-            women_likes_received = []
-            for uid, _ in women_matches:
-                count = full_log[(full_log["CandidateID"]==uid) & (full_log["Decision"]=="Like")].shape[0]
-                women_likes_received.append(count)
-
-            if plot_type == "Bar Chart":
-              # Match plots - Bar Chart
-              if show_match_plots:
-                  axes[0,0].bar(range(len(men_matches)), [x[1] for x in men_matches],
-                              color="skyblue", edgecolor="black")
-                  axes[0,0].set_title("Men's Match Counts (Sorted)")
-                  axes[0,0].set_xlabel("Men (sorted by match count)")
-                  axes[0,0].set_ylabel("Number of Matches")
-                  
-                  axes[0,1].bar(range(len(women_matches)), [x[1] for x in women_matches],
-                              color="lightpink", edgecolor="black")
-                  axes[0,1].set_title("Women's Match Counts (Sorted)")
-                  axes[0,1].set_xlabel("Women (sorted by match count)")
-                  axes[0,1].set_ylabel("Number of Matches")
-              else:
-                  axes[0,0].axis('off')
-                  axes[0,1].axis('off')
-              
-              # Like plots - Likes Sent (Bar Chart)
-              if show_like_plots:
-                  axes[1,0].bar(range(len(men_matches)), men_likes_sent,
-                              color="skyblue", edgecolor="black")
-                  axes[1,0].set_title("Men's Likes Sent (Sorted by Match Count)")
-                  axes[1,0].set_xlabel("Men (sorted by match count)")
-                  axes[1,0].set_ylabel("Number of Likes Sent")
-                  
-                  axes[1,1].bar(range(len(women_matches)), women_likes_sent,
-                              color="lightpink", edgecolor="black")
-                  axes[1,1].set_title("Women's Likes Sent (Sorted by Match Count)")
-                  axes[1,1].set_xlabel("Women (sorted by match count)")
-                  axes[1,1].set_ylabel("Number of Likes Sent")
-              else:
-                  axes[1,0].axis('off')
-                  axes[1,1].axis('off')
-                  
-              # Likes Received plots - Bar Chart
-              if show_like_plots:
-                  axes[2,0].bar(range(len(men_matches)), men_likes_received,
-                              color="skyblue", edgecolor="black")
-                  axes[2,0].set_title("Men's Likes Received (Sorted by Match Count)")
-                  axes[2,0].set_xlabel("Men (sorted by match count)")
-                  axes[2,0].set_ylabel("Number of Likes Received")
-                  
-                  axes[2,1].bar(range(len(women_matches)), women_likes_received,
-                              color="lightpink", edgecolor="black")
-                  axes[2,1].set_title("Women's Likes Received (Sorted by Match Count)")
-                  axes[2,1].set_xlabel("Women (sorted by match count)")
-                  axes[2,1].set_ylabel("Number of Likes Received")
-              else:
-                  axes[2,0].axis('off')
-                  axes[2,1].axis('off')
-
-            elif plot_type == "Histogram":
-              # Fixed bin labels for histogram plots.
-              bin_labels = ["0", "1-3", "4-7", "8+"]
-              # Function to compute histogram counts for fixed bins:
-              # - Count exactly 0, counts between 1 and 2, between 3 and 4, and 5 or more.
-              def compute_hist_counts(data):
-                  data = np.array(data)
-                  bin0 = np.sum(data == 0)
-                  bin1 = np.sum((data >= 1) & (data <= 3))
-                  bin2 = np.sum((data >= 4) & (data <= 7))
-                  bin3 = np.sum(data >= 8)
-                  return [bin0, bin1, bin2, bin3]
-              
-              # Compute histogram counts for matches and likes.
-              men_match_data = [x[1] for x in men_matches]
-              women_match_data = [x[1] for x in women_matches]
-              men_match_hist = compute_hist_counts(men_match_data)
-              women_match_hist = compute_hist_counts(women_match_data)
-              men_likes_hist = compute_hist_counts(men_likes_sent)
-              women_likes_hist = compute_hist_counts(women_likes_sent)
-              men_likes_received_hist = compute_hist_counts(men_likes_received)
-              women_likes_received_hist = compute_hist_counts(women_likes_received)
-              
-              # Men's match histogram
-              if show_match_plots:
-                  axes[0,0].bar(range(len(men_match_hist)), men_match_hist,
-                                color="skyblue", edgecolor="black", width=0.8)
-                  axes[0,0].set_title("Histogram of Men's Match Counts")
-                  axes[0,0].set_xlabel("Match Count Bins")
-                  axes[0,0].set_ylabel("Number of Men")
-                  axes[0,0].set_xticks(range(len(bin_labels)))
-                  axes[0,0].set_xticklabels(bin_labels)
-              else:
-                  axes[0,0].axis('off')
-              
-              # Women's match histogram
-              if show_match_plots:
-                  axes[0,1].bar(range(len(women_match_hist)), women_match_hist,
-                                color="lightpink", edgecolor="black", width=0.8)
-                  axes[0,1].set_title("Histogram of Women's Match Counts")
-                  axes[0,1].set_xlabel("Match Count Bins")
-                  axes[0,1].set_ylabel("Number of Women")
-                  axes[0,1].set_xticks(range(len(bin_labels)))
-                  axes[0,1].set_xticklabels(bin_labels)
-              else:
-                  axes[0,1].axis('off')
-              
-              # Men's likes sent histogram
-              if show_like_plots:
-                  axes[1,0].bar(range(len(men_likes_hist)), men_likes_hist,
-                                color="skyblue", edgecolor="black", width=0.8)
-                  axes[1,0].set_title("Histogram of Men's Likes Sent")
-                  axes[1,0].set_xlabel("Likes Sent Count Bins")
-                  axes[1,0].set_ylabel("Number of Men")
-                  axes[1,0].set_xticks(range(len(bin_labels)))
-                  axes[1,0].set_xticklabels(bin_labels)
-              else:
-                  axes[1,0].axis('off')
-              
-              # Women's likes sent histogram
-              if show_like_plots:
-                  axes[1,1].bar(range(len(women_likes_hist)), women_likes_hist,
-                                color="lightpink", edgecolor="black", width=0.8)
-                  axes[1,1].set_title("Histogram of Women's Likes Sent")
-                  axes[1,1].set_xlabel("Likes Sent Count Bins")
-                  axes[1,1].set_ylabel("Number of Women")
-                  axes[1,1].set_xticks(range(len(bin_labels)))
-                  axes[1,1].set_xticklabels(bin_labels)
-              else:
-                  axes[1,1].axis('off')
-                  
-              # Men's likes received histogram
-              if show_like_plots:
-                  axes[2,0].bar(range(len(men_likes_received_hist)), men_likes_received_hist,
-                                color="skyblue", edgecolor="black", width=0.8)
-                  axes[2,0].set_title("Histogram of Men's Likes Received")
-                  axes[2,0].set_xlabel("Likes Received Count Bins")
-                  axes[2,0].set_ylabel("Number of Men")
-                  axes[2,0].set_xticks(range(len(bin_labels)))
-                  axes[2,0].set_xticklabels(bin_labels)
-              else:
-                  axes[2,0].axis('off')
-              
-              # Women's likes received histogram
-              if show_like_plots:
-                  axes[2,1].bar(range(len(women_likes_received_hist)), women_likes_received_hist,
-                                color="lightpink", edgecolor="black", width=0.8)
-                  axes[2,1].set_title("Histogram of Women's Likes Received")
-                  axes[2,1].set_xlabel("Likes Received Count Bins")
-                  axes[2,1].set_ylabel("Number of Women")
-                  axes[2,1].set_xticks(range(len(bin_labels)))
-                  axes[2,1].set_xticklabels(bin_labels)
-              else:
-                  axes[2,1].axis('off')
-            
-            plt.tight_layout()
-            
-            buf = io.BytesIO()
-            plt.savefig(buf, format="svg")
-            buf.seek(0)
-            plot_img = base64.b64encode(buf.getvalue()).decode("utf8")
-            plt.close(fig)
+        summary_html, plot_img = build_results(
+            counters, weight_reciprocal, weight_queue_penalty,
+            show_match_plots, show_like_plots, plot_type
+        )
         # TODO: add full simulation trace exports as xlsx, when ready; use download prop
         # Jack & Jill traces too
         return render_template_string("""
@@ -377,11 +410,141 @@ def index():
             <option value="Histogram">Histogram</option>
           </select>
 
+          <label for="shard_by">Markets:</label>
+          <select id="shard_by" name="shard_by">
+            <option value="">One market (everyone can see everyone)</option>
+            {% for attribute in shard_attributes %}
+            <option value="{{ attribute }}">Separate sub-markets by {{ attribute }}</option>
+            {% endfor %}
+          </select>
+
           <input type="submit" value="Run Simulation">
         </form>
+        <div id="progress" style="display:none; margin-top:20px;"></div>
+        <div id="results"></div>
+        <script>
+          // Stream progress from /stream when the browser supports SSE; otherwise fall back to the POST.
+          var form = document.querySelector("form");
+          form.addEventListener("submit", function (e) {
+            if (!window.EventSource) { return; }
+            e.preventDefault();
+            var submit = form.querySelector("input[type=submit]");
+            var progress = document.getElementById("progress");
+            var results = document.getElementById("results");
+            submit.disabled = true;
+            results.innerHTML = "";
+            progress.style.display = "block";
+            progress.innerHTML = "Starting simulation...";
+            var query = new URLSearchParams(new FormData(form)).toString();
+            var source = new EventSource("{{ url_for('stream') }}?" + query);
+            source.addEventListener("progress", function (msg) {
+              var p = JSON.parse(msg.data);
+              if (p.shards_total) {
+                progress.innerHTML = "<b>Sub-market " + p.shards_done + " of " + p.shards_total +
+                  " finished</b> (" + p.shard + ")<br>" +
+                  "Likes so far: " + p.likes + "<br>" +
+                  "Matches so far: " + p.matches + "<br>" +
+                  "Pending likes: " + p.pending_likes;
+                return;
+              }
+              progress.innerHTML = "<b>Day " + p.day + " of " + p.num_days + "</b><br>" +
+                "Likes so far: " + p.likes + "<br>" +
+                "Matches so far: " + p.matches + "<br>" +
+                "Pending likes: " + p.pending_likes +
+                " (for men: " + p.pending_for_men + ", for women: " + p.pending_for_women +
+                ", longest queue: " + p.max_queue + ")";
+            });
+            source.addEventListener("result", function (msg) {
+              var r = JSON.parse(msg.data);
+              source.close();
+              progress.style.display = "none";
+              results.innerHTML = "<div class='summary' style='margin-top:30px;'>" + r.summary_html + "</div>" +
+                (r.plot_img ? "<img src='data:image/svg+xml;base64," + r.plot_img + "' alt='Plots'>" : "");
+              submit.disabled = false;
+            });
+            source.addEventListener("error", function (msg) {
+              source.close();
+              var detail = msg.data ? JSON.parse(msg.data).message : "connection lost";
+              progress.innerHTML = "Simulation failed: " + detail;
+              submit.disabled = false;
+            });
+          });
+        </script>
       </body>
     </html>
-    """)
+    """, shard_attributes=SHARD_ATTRIBUTES)
+
+def sse_event(event, data):
+    """Format one Server-Sent Event with a JSON payload."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@app.route("/stream")
+def stream():
+    """
+    Runs a simulation and streams per-day progress as Server-Sent Events.
+
+    Emits "progress" events with the running metrics from run_dating_simulation,
+    then a single "result" event carrying the rendered summary and plot (or "error").
+    If the client disconnects, the underlying run is cancelled within a few dozen logins.
+    Sharded runs (shard_by) report one "progress" event per finished sub-market instead.
+    """
+    try:
+        params = parse_simulation_params(request.args)
+        shard_by = parse_shard_by(request.args)
+    except ValueError:
+        return "Invalid parameter(s) provided.", 400
+
+    events = queue.Queue()
+    cancelled = threading.Event()
+
+    def check_cancelled():
+        if cancelled.is_set():
+            raise SimulationCancelled()
+
+    def on_progress(progress):
+        check_cancelled()
+        events.put(("progress", progress))
+
+    def worker():
+        try:
+            events.put(("result", simulate(
+                params, shard_by, progress_callback=on_progress, cancel_check=check_cancelled)))
+        except SimulationCancelled:
+            pass
+        except Exception as exc:
+            events.put(("error", str(exc)))
+
+    def generate():
+        threading.Thread(target=worker, daemon=True).start()
+        try:
+            while True:
+                try:
+                    kind, payload = events.get(timeout=SSE_KEEPALIVE_SECONDS)
+                except queue.Empty:
+                    # Writing to a closed connection is how we notice a disconnect.
+                    yield ": keepalive\n\n"
+                    continue
+                if kind == "progress":
+                    yield sse_event("progress", payload)
+                elif kind == "error":
+                    yield sse_event("error", {"message": payload})
+                    return
+                else:
+                    summary_html, plot_img = build_results(
+                        payload, params["weight_reciprocal"], params["weight_queue_penalty"],
+                        params["show_match_plots"], params["show_like_plots"], params["plot_type"]
+                    )
+                    yield sse_event("result", {"summary_html": summary_html, "plot_img": plot_img})
+                    return
+        finally:
+            # Runs on normal completion and when the client goes away (GeneratorExit).
+            cancelled.set()
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
 if __name__ == "__main__":
     app.run(debug=True)
\ No newline at end of file
@@ -34,6 +34,107 @@ jill_id = (woman_avgs - overall_woman_avg).abs().idxmin()
 
 print(f"Selected Jack: {jack_id}, Selected Jill: {jill_id}")
 
+class SimulationCancelled(Exception):
+    """Raised from a progress callback or cancel_check to abort a running simulation."""
+
+# Logins between two cancel_check calls within a simulated day.
+CANCEL_CHECK_LOGINS = 64
+
+##############################################################################
+# 1.6) FLAT COUNTERS AND PROGRESS METRICS (SHARED BY ALL ENGINES)
+##############################################################################
+AGGREGATE_FIELDS = [
+    "views",              # profiles the user was shown
+    "likes_sent",
+    "likes_received",
+    "matches",
+    "delay_total",        # sum over views of (day seen - day the like was sent)
+    "unseen_likes_sent",  # likes by the user still pending at the end
+    "stale_likes_sent",   # ...of which were sent before the final day
+]
+
+def new_aggregate_counters(user_ids):
+    """
+    Zeroed counters for record="aggregate": one int64 array per field in AGGREGATE_FIELDS,
+    aligned with user_ids. Global totals (total_views, total_likes, ...) are added at the end.
+    """
+    counters = {"user_ids": list(user_ids)}
+    for field in AGGREGATE_FIELDS:
+        counters[field] = np.zeros(len(user_ids), dtype=np.int64)
+    return counters
+
+def finalize_aggregate_counters(counters, pending_senders, pending_stale, num_days, total_likes, total_matches):
+    """
+    Completes counters from new_aggregate_counters once a run ends: likes still pending
+    (one entry per like: sender index into user_ids, and whether it counts as stale) are
+    attributed to their senders, and the global totals are added. Shared by all engines.
+    """
+    n = len(counters["user_ids"])
+    pending_senders = np.asarray(pending_senders, dtype=np.int64)
+    pending_stale = np.asarray(pending_stale, dtype=bool)
+    counters["unseen_likes_sent"] = np.bincount(pending_senders, minlength=n).astype(np.int64)
+    counters["stale_likes_sent"] = np.bincount(pending_senders[pending_stale], minlength=n).astype(np.int64)
+    counters["num_days"] = num_days
+    counters["total_views"] = int(counters["views"].sum())
+    counters["total_likes"] = int(total_likes)
+    counters["total_matches"] = int(total_matches)
+    counters["total_delay"] = int(counters["delay_total"].sum())
+    counters["total_unseen"] = int(counters["unseen_likes_sent"].sum())
+    counters["total_stale"] = int(counters["stale_likes_sent"].sum())
+    return counters
+
+def pending_likes_from_matrices(pending_w, pending_m, nw, empty=0):
+    """
+    Likes still pending in the array engines' side-local matrices, as (sender indices into
+    user_ids, sent day or time) for finalize_aggregate_counters. pending_w[woman, man] holds
+    man -> woman likes and pending_m[man, woman] woman -> man likes; cells equal to `empty`
+    (0, or NaN in the event scheduler) hold none.
+    """
+    if np.isnan(empty):
+        to_women, to_men = np.nonzero(~np.isnan(pending_w)), np.nonzero(~np.isnan(pending_m))
+    else:
+        to_women, to_men = np.nonzero(pending_w != empty), np.nonzero(pending_m != empty)
+    senders = np.concatenate([nw + to_women[1], to_men[1]])
+    sent = np.concatenate([pending_w[to_women], pending_m[to_men]])
+    return senders, sent
+
+def progress_metrics(day, num_days, likes, matches, queue_len, nw):
+    """
+    The running metrics passed to progress_callback (and streamed by /stream) by every
+    engine. queue_len holds each user's pending incoming likes, women (the first nw) first.
+    """
+    queue_len = np.asarray(queue_len, dtype=np.int64)
+    return {
+        "day": int(day),
+        "num_days": int(num_days),
+        "likes": int(likes),
+        "matches": int(matches),
+        "pending_likes": int(queue_len.sum()),
+        "pending_for_men": int(queue_len[nw:].sum()),
+        "pending_for_women": int(queue_len[:nw].sum()),
+        "max_queue": int(queue_len.max()) if queue_len.size else 0
+    }
+
+##############################################################################
+# 1.7) SUB-MARKETS
+##############################################################################
+def make_market(women_ids, men_ids):
+    """
+    A self-contained market: the given users plus the probability matrices sliced to them.
+    Passing one to run_dating_simulation(market=...) simulates only those users.
+    """
+    if women_ids is all_women_ids and men_ids is all_men_ids:
+        wm, mw = prob_women_likes_men, prob_men_likes_women
+    else:
+        wm = prob_women_likes_men.loc[list(women_ids), list(men_ids)]
+        mw = prob_men_likes_women.loc[list(men_ids), list(women_ids)]
+    return {
+        "women_ids": list(women_ids),
+        "men_ids": list(men_ids),
+        "prob_women_likes_men": wm,
+        "prob_men_likes_women": mw,
+    }
+
 ##############################################################################
 # 2) THE HINGE-LIKE SIMULATION FUNCTION WITH PERSISTENT UPDATING
 ##############################################################################
@@ -51,7 +152,12 @@ def run_dating_simulation(
     summary_out=None,
     plot_out=None,
     trace_out=None,
-    trace_jj_out=None
+    trace_jj_out=None,
+    progress_callback=None,
+    record="full",
+    engine="python",
+    market=None,
+    cancel_check=None
 ):
     """
     Runs a Tinder-style simulation in which, upon logging in,
@@ -64,42 +170,104 @@ def run_dating_simulation(
             S₍ᵢⱼ₎ = Pᵢⱼ * 1/(1 + w_queue*Qⱼ) * (Pⱼᵢ)^(w_reciprocal)
 
     Extra metrics (unseen and stale unseen likes) and Jack & Jill trace export are also provided.
+
+    If progress_callback is given, it is called once at the end of every day with a dict of
+    running metrics (day, num_days, cumulative likes and matches, pending queue sizes).
+    The callback may raise SimulationCancelled to stop the run early. cancel_check, if
+    given, is called every CANCEL_CHECK_LOGINS logins and may raise the same way, so a
+    cancelled run stops mid-day.
+
+    Each run draws from its own generators seeded with random_seed (the login shuffles
+    from a random.Random, the like/pass rolls from a np.random.RandomState), so runs on
+    other threads cannot disturb its sequence.
+
+    record="full" (default) returns (daily_logs, matches, incoming_likes) with one row per
+    profile view. record="aggregate" keeps no event log: it maintains flat per-user counter
+    arrays during the loop and returns them directly (see new_aggregate_counters).
+
+    engine="jit" runs the same loop as a Numba-compiled kernel over flat arrays
+    (see jit_engine.py) with the same results for the same seed; without Numba
+    installed it falls back to this pure-Python engine.
+
+    market restricts the run to a sub-market (see make_market); by default the whole
+    population loaded from the CSVs is simulated.
     """
-    # Set seeds for reproducibility.
-    np.random.seed(random_seed)
-    random.seed(random_seed)
+    if record not in ("full", "aggregate"):
+        raise ValueError(f"record must be 'full' or 'aggregate', got {record!r}")
+    if engine not in ("python", "jit"):
+        raise ValueError(f"engine must be 'python' or 'jit', got {engine!r}")
+    if market is None:
+        market = make_market(all_women_ids, all_men_ids)
+    women_ids, men_ids = market["women_ids"], market["men_ids"]
+    user_ids = women_ids + men_ids
+    prob_wm, prob_mw = market["prob_women_likes_men"], market["prob_men_likes_women"]
+
+    if engine == "jit":
+        from jit_engine import HAVE_NUMBA, run_compiled_simulation
+        if HAVE_NUMBA:
+            return run_compiled_simulation(
+                women_ids, men_ids, prob_wm, prob_mw,
+                num_days=num_days,
+                daily_queue_size=daily_queue_size,
+                weight_reciprocal=weight_reciprocal,
+                weight_queue_penalty=weight_queue_penalty,
+                random_seed=random_seed,
+                progress_callback=progress_callback,
+                record=record,
+                cancel_check=cancel_check
+            )
+    keep_log = record == "full"
+
+    # Per-run generators for reproducibility (same streams as seeding the global ones).
+    rng = random.Random(random_seed)
+    nrng = np.random.RandomState(random_seed)
     
     # Simulation state dictionaries.
-    incoming_likes = {uid: [] for uid in all_user_ids}   # store (sender, sent_day)
-    matches = {uid: set() for uid in all_user_ids}
-    likes_sent = {uid: set() for uid in all_user_ids}
+    incoming_likes = {uid: [] for uid in user_ids}   # store (sender, sent_day)
+    matches = {uid: set() for uid in user_ids}
+    likes_sent = {uid: set() for uid in user_ids}
     daily_logs = []  # one DataFrame per day
 
     # NEW: Track who each user has "already_seen" so they won't reappear.
-    already_seen = {uid: set() for uid in all_user_ids}
+    already_seen = {uid: set() for uid in user_ids}
+
+    # Running totals reported to progress_callback.
+    total_likes = 0
+    total_matches = 0
+
+    # Flat per-user counters for record="aggregate".
+    if not keep_log:
+        counters = new_aggregate_counters(user_ids)
+        user_index = {uid: i for i, uid in enumerate(user_ids)}
+        views, delays = counters["views"], counters["delay_total"]
+        sent, received, matched = counters["likes_sent"], counters["likes_received"], counters["matches"]
     
     # Run simulation for num_days
     for day in range(1, num_days + 1):
         day_records = []
-        login_order = all_user_ids.copy()
-        random.shuffle(login_order)
+        login_order = user_ids.copy()
+        rng.shuffle(login_order)
         
-        for user in login_order:
+        for login, user in enumerate(login_order):
+            if cancel_check is not None and login % CANCEL_CHECK_LOGINS == 0:
+                cancel_check()
+            if not keep_log:
+                ui = user_index[user]
             # Opposite-gender pool, not matched yet, not already seen
             if user.startswith("W"):
                 candidate_pool = [
-                    cid for cid in all_men_ids
+                    cid for cid in men_ids
                     if cid not in matches[user] and cid not in already_seen[user]
                 ]
-                get_prob = lambda cand: prob_women_likes_men.loc[user, cand]
-                get_reciprocal = lambda cand: prob_men_likes_women.loc[cand, user]
+                get_prob = lambda cand: prob_wm.loc[user, cand]
+                get_reciprocal = lambda cand: prob_mw.loc[cand, user]
             else:
                 candidate_pool = [
-                    cid for cid in all_women_ids
+                    cid for cid in women_ids
                     if cid not in matches[user] and cid not in already_seen[user]
                 ]
-                get_prob = lambda cand: prob_men_likes_women.loc[user, cand]
-                get_reciprocal = lambda cand: prob_women_likes_men.loc[cand, user]
+                get_prob = lambda cand: prob_mw.loc[user, cand]
+                get_reciprocal = lambda cand: prob_wm.loc[cand, user]
             
             # Build lookup of incoming likes (keep earliest day if multiple)
             incoming_for_user = {}
@@ -137,7 +305,7 @@ def run_dating_simulation(
                 source = cand_record["Source"]
                 sent_day = cand_record["SentDay"]
                 like_prob = get_prob(cand)
-                roll = np.random.rand()
+                roll = nrng.rand()
                 decision = "Pass"
                 match_formed = False
 
@@ -151,9 +319,11 @@ def run_dating_simulation(
                 # Decide "Like" or "Pass"
                 if roll < like_prob:
                     decision = "Like"
+                    total_likes += 1
                     if user in likes_sent[cand]:
                         # cand had previously liked user => match
                         match_formed = True
+                        total_matches += 1
                         matches[user].add(cand)
                         matches[cand].add(user)
                     else:
@@ -162,22 +332,48 @@ def run_dating_simulation(
                             incoming_likes[cand].append((user, day))
                 
                 delay = day - sent_day
-                day_records.append({
-                    "Day": day,
-                    "UserID": user,
-                    "CandidateID": cand,
-                    "Score": cand_record["Score"],
-                    "Source": source,
-                    "LikeProbability": like_prob,
-                    "RandomRoll": roll,
-                    "Decision": decision,
-                    "MatchFormed": match_formed,
-                    "Delay": delay
-                })
+                if keep_log:
+                    day_records.append({
+                        "Day": day,
+                        "UserID": user,
+                        "CandidateID": cand,
+                        "Score": cand_record["Score"],
+                        "Source": source,
+                        "LikeProbability": like_prob,
+                        "RandomRoll": roll,
+                        "Decision": decision,
+                        "MatchFormed": match_formed,
+                        "Delay": delay
+                    })
+                else:
+                    ci = user_index[cand]
+                    views[ui] += 1
+                    delays[ui] += delay
+                    if decision == "Like":
+                        sent[ui] += 1
+                        received[ci] += 1
+                        if match_formed:
+                            matched[ui] += 1
+                            matched[ci] += 1
 
                 # Mark cand as seen so user won't see them again in future
                 already_seen[user].add(cand)
         
-        daily_logs.append(pd.DataFrame(day_records))
+        if keep_log:
+            daily_logs.append(pd.DataFrame(day_records))
+
+        if progress_callback is not None:
+            queue_sizes = [len(incoming_likes[uid]) for uid in user_ids]
+            progress_callback(progress_metrics(
+                day, num_days, total_likes, total_matches, queue_sizes, len(women_ids)
+            ))
     
+    if not keep_log:
+        pending = [(user_index[sender], sent_day < num_days)
+                   for uid in user_ids for sender, sent_day in incoming_likes[uid]]
+        return finalize_aggregate_counters(
+            counters, [si for si, _ in pending], [stale for _, stale in pending],
+            num_days, total_likes, total_matches
+        )
+
     return daily_logs, matches, incoming_likes
\ No newline at end of file
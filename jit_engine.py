@@ -0,0 +1,304 @@
+"""
+Compiled backend for run_dating_simulation(engine="jit").
+
+Runs the same sequential per-login loop as the reference engine in backend.py
+(filter pool, score, select top-k, roll, update queues/matches/seen), but over flat
+integer/float arrays inside a Numba-compiled kernel. Numba is optional: when it is
+not installed, HAVE_NUMBA is False and backend falls back to the pure-Python engine.
+
+Given the same seed the results are the same as the reference engine: login orders
+come from the same `random.Random(seed).shuffle` calls and like/pass rolls are taken,
+in order, from the same `np.random.RandomState(seed).rand` stream.
+"""
+import random
+
+import numpy as np
+import pandas as pd
+
+from backend import (
+    CANCEL_CHECK_LOGINS, new_aggregate_counters, finalize_aggregate_counters,
+    pending_likes_from_matrices, progress_metrics
+)
+
+try:
+    from numba import njit
+    HAVE_NUMBA = True
+except ImportError:  # pragma: no cover - depends on the environment
+    HAVE_NUMBA = False
+
+    def njit(*args, **kwargs):
+        """Stand-in so the kernel still imports (and runs, slowly) without Numba."""
+        if len(args) == 1 and callable(args[0]) and not kwargs:
+            return args[0]
+        return lambda func: func
+
+##############################################################################
+# 1) THE PER-DAY KERNEL
+##############################################################################
+@njit(cache=True, nogil=True)
+def _simulate_day(
+    day, login_order, nw, daily_queue_size, weight_reciprocal, weight_queue_penalty,
+    prob_w, prob_m,
+    seen_w, seen_m, matched, liked_w, liked_m, pending_w, pending_m, queue_len,
+    rolls, roll_ptr, keep_log, n_rec,
+    rec_user, rec_cand, rec_score, rec_incoming, rec_prob, rec_roll, rec_like, rec_match, rec_delay,
+    views, likes_sent, likes_received, match_counts, delay_total, totals,
+    buf_cand, buf_score, buf_incoming, buf_sent, buf_taken
+):
+    """
+    Simulates the logins in login_order (one day, or a slice of it). Users are indexed
+    women first (0..nw-1) then men (nw..). Side-local matrices are indexed [own, other]:
+    prob_w[i, j] = P(woman i likes man j), prob_m[j, i] = P(man j likes woman i),
+    pending_w[i, j] = day man j's pending like to woman i was sent (0 = none),
+    and likewise for the men's side. `matched` is indexed [woman, man].
+    Log records are written from index n_rec on. Runs without the GIL, so threads such
+    as a queue worker's heartbeat keep going during long days.
+    Returns (updated number of log records, updated roll pointer).
+    """
+    for u in login_order:
+        is_woman = u < nw
+        own = u if is_woman else u - nw
+        n_other = prob_w.shape[1] if is_woman else prob_m.shape[1]
+
+        # Candidate pool and scores (pool order = other side's id order).
+        pool = 0
+        for j in range(n_other):
+            if is_woman:
+                if matched[own, j] or seen_w[own, j]:
+                    continue
+                p = prob_w[own, j]
+                r = prob_m[j, own]
+                pend = pending_w[own, j]
+                cand = nw + j
+            else:
+                if matched[j, own] or seen_m[own, j]:
+                    continue
+                p = prob_m[own, j]
+                r = prob_w[j, own]
+                pend = pending_m[own, j]
+                cand = j
+            buf_cand[pool] = j
+            if pend > 0:
+                buf_score[pool] = p
+                buf_incoming[pool] = True
+                buf_sent[pool] = pend
+            else:
+                q = queue_len[cand]
+                buf_score[pool] = p * (1 / (1 + weight_queue_penalty * q)) * (r ** weight_reciprocal)
+                buf_incoming[pool] = False
+                buf_sent[pool] = day
+            buf_taken[pool] = False
+            pool += 1
+
+        # Top-k by descending score; ties keep pool order (like a stable sort).
+        for _ in range(min(daily_queue_size, pool)):
+            best = -1
+            for c in range(pool):
+                if not buf_taken[c] and (best < 0 or buf_score[c] > buf_score[best]):
+                    best = c
+            buf_taken[best] = True
+
+            j = buf_cand[best]
+            cand = nw + j if is_woman else j
+            like_prob = prob_w[own, j] if is_woman else prob_m[own, j]
+            roll = rolls[roll_ptr]
+            roll_ptr += 1
+            incoming = buf_incoming[best]
+
+            # Remove pending like as soon as user sees it.
+            if incoming:
+                if is_woman:
+                    pending_w[own, j] = 0
+                else:
+                    pending_m[own, j] = 0
+                queue_len[u] -= 1
+
+            like = roll < like_prob
+            match = False
+            if like:
+                totals[0] += 1
+                likes_sent[u] += 1
+                likes_received[cand] += 1
+                cand_liked_user = liked_m[j, own] if is_woman else liked_w[j, own]
+                if cand_liked_user:
+                    match = True
+                    totals[1] += 1
+                    match_counts[u] += 1
+                    match_counts[cand] += 1
+                    if is_woman:
+                        matched[own, j] = True
+                    else:
+                        matched[j, own] = True
+                else:
+                    if is_woman:
+                        liked_w[own, j] = True
+                    else:
+                        liked_m[own, j] = True
+                    if not incoming:
+                        if is_woman:
+                            pending_m[j, own] = day
+                        else:
+                            pending_w[j, own] = day
+                        queue_len[cand] += 1
+
+            delay = day - buf_sent[best]
+            views[u] += 1
+            delay_total[u] += delay
+            if keep_log:
+                rec_user[n_rec] = u
+                rec_cand[n_rec] = cand
+                rec_score[n_rec] = buf_score[best]
+                rec_incoming[n_rec] = incoming
+                rec_prob[n_rec] = like_prob
+                rec_roll[n_rec] = roll
+                rec_like[n_rec] = like
+                rec_match[n_rec] = match
+                rec_delay[n_rec] = delay
+                n_rec += 1
+
+            # Mark cand as seen so user won't see them again in future
+            if is_woman:
+                seen_w[own, j] = True
+            else:
+                seen_m[own, j] = True
+    return n_rec, roll_ptr
+
+##############################################################################
+# 2) DRIVER: STATE ARRAYS, RNG STREAMS, OUTPUT IN THE REFERENCE FORMAT
+##############################################################################
+def run_compiled_simulation(
+    women_ids,
+    men_ids,
+    prob_women_likes_men,
+    prob_men_likes_women,
+    num_days=3,
+    daily_queue_size=5,
+    weight_reciprocal=1.0,
+    weight_queue_penalty=0.5,
+    random_seed=42,
+    progress_callback=None,
+    record="full",
+    cancel_check=None
+):
+    """
+    Array-backed equivalent of backend.run_dating_simulation. The probability matrices are
+    DataFrames labelled by user id (as loaded from the CSVs); return values follow `record`
+    exactly as in the reference engine. In full mode, each incoming_likes list is ordered
+    by sent day rather than by arrival within the day.
+
+    Memory is dense in the number of woman-man pairs: two float64 probability matrices,
+    five bool and two int32 state matrices, i.e. about 29 bytes per pair on top of the
+    input DataFrames (another 16). That is ~45 GB for 25k x 25k users and ~110 GB for
+    50k x 50k, so populations of 100k users do not fit without sparse candidate sets.
+
+    cancel_check, if given, is called between slices of CANCEL_CHECK_LOGINS logins.
+    """
+    rng = random.Random(random_seed)
+    nrng = np.random.RandomState(random_seed)
+
+    user_ids = list(women_ids) + list(men_ids)
+    nw, nm = len(women_ids), len(men_ids)
+    n = nw + nm
+    k = int(daily_queue_size)
+
+    prob_w = np.ascontiguousarray(prob_women_likes_men.loc[women_ids, men_ids].to_numpy(dtype=np.float64))
+    prob_m = np.ascontiguousarray(prob_men_likes_women.loc[men_ids, women_ids].to_numpy(dtype=np.float64))
+
+    seen_w = np.zeros((nw, nm), dtype=np.bool_)
+    seen_m = np.zeros((nm, nw), dtype=np.bool_)
+    matched = np.zeros((nw, nm), dtype=np.bool_)
+    liked_w = np.zeros((nw, nm), dtype=np.bool_)
+    liked_m = np.zeros((nm, nw), dtype=np.bool_)
+    pending_w = np.zeros((nw, nm), dtype=np.int32)
+    pending_m = np.zeros((nm, nw), dtype=np.int32)
+    queue_len = np.zeros(n, dtype=np.int64)
+
+    keep_log = record == "full"
+    per_day = n * k if keep_log else 0
+    rec_user = np.zeros(per_day, dtype=np.int64)
+    rec_cand = np.zeros(per_day, dtype=np.int64)
+    rec_score = np.zeros(per_day, dtype=np.float64)
+    rec_incoming = np.zeros(per_day, dtype=np.bool_)
+    rec_prob = np.zeros(per_day, dtype=np.float64)
+    rec_roll = np.zeros(per_day, dtype=np.float64)
+    rec_like = np.zeros(per_day, dtype=np.bool_)
+    rec_match = np.zeros(per_day, dtype=np.bool_)
+    rec_delay = np.zeros(per_day, dtype=np.int64)
+
+    counters = new_aggregate_counters(user_ids)
+    views, delay_total = counters["views"], counters["delay_total"]
+    likes_sent, likes_received = counters["likes_sent"], counters["likes_received"]
+    match_counts = counters["matches"]
+    totals = np.zeros(2, dtype=np.int64)  # likes, matches
+
+    width = max(nw, nm)
+    buf_cand = np.zeros(width, dtype=np.int64)
+    buf_score = np.zeros(width, dtype=np.float64)
+    buf_incoming = np.zeros(width, dtype=np.bool_)
+    buf_sent = np.zeros(width, dtype=np.int64)
+    buf_taken = np.zeros(width, dtype=np.bool_)
+
+    uid_array = np.array(user_ids, dtype=object)
+    rolls = np.zeros(0, dtype=np.float64)
+    roll_ptr = 0
+    daily_logs = []
+
+    for day in range(1, num_days + 1):
+        # Same permutation as shuffling a copy of all_user_ids.
+        login_order = list(range(n))
+        rng.shuffle(login_order)
+        login_order = np.array(login_order, dtype=np.int64)
+
+        # Top up the roll buffer so a day can never run dry; unused rolls carry over,
+        # keeping the draws a single continuous nrng.rand stream.
+        rolls = np.concatenate([rolls[roll_ptr:], nrng.rand(n * k - (len(rolls) - roll_ptr))])
+        roll_ptr = 0
+
+        n_rec = 0
+        for start in range(0, n, CANCEL_CHECK_LOGINS):
+            if cancel_check is not None:
+                cancel_check()
+            n_rec, roll_ptr = _simulate_day(
+                day, login_order[start:start + CANCEL_CHECK_LOGINS], nw, k,
+                float(weight_reciprocal), float(weight_queue_penalty),
+                prob_w, prob_m,
+                seen_w, seen_m, matched, liked_w, liked_m, pending_w, pending_m, queue_len,
+                rolls, roll_ptr, keep_log, n_rec,
+                rec_user, rec_cand, rec_score, rec_incoming, rec_prob, rec_roll, rec_like, rec_match, rec_delay,
+                views, likes_sent, likes_received, match_counts, delay_total, totals,
+                buf_cand, buf_score, buf_incoming, buf_sent, buf_taken
+            )
+
+        if keep_log:
+            daily_logs.append(pd.DataFrame({
+                "Day": np.full(n_rec, day, dtype=np.int64),
+                "UserID": uid_array[rec_user[:n_rec]],
+                "CandidateID": uid_array[rec_cand[:n_rec]],
+                "Score": rec_score[:n_rec].copy(),
+                "Source": np.where(rec_incoming[:n_rec], "incoming", "fresh").astype(object),
+                "LikeProbability": rec_prob[:n_rec].copy(),
+                "RandomRoll": rec_roll[:n_rec].copy(),
+                "Decision": np.where(rec_like[:n_rec], "Like", "Pass").astype(object),
+                "MatchFormed": rec_match[:n_rec].copy(),
+                "Delay": rec_delay[:n_rec].copy(),
+            }))
+
+        if progress_callback is not None:
+            progress_callback(progress_metrics(day, num_days, totals[0], totals[1], queue_len, nw))
+
+    if keep_log:
+        matches = {uid: set() for uid in user_ids}
+        for i, j in zip(*np.nonzero(matched)):
+            matches[women_ids[i]].add(men_ids[j])
+            matches[men_ids[j]].add(women_ids[i])
+        incoming_likes = {uid: [] for uid in user_ids}
+        for pending, recipients, senders in ((pending_w, women_ids, men_ids), (pending_m, men_ids, women_ids)):
+            for i, j in sorted(zip(*np.nonzero(pending)), key=lambda ij: (pending[ij], ij[1])):
+                incoming_likes[recipients[i]].append((senders[j], int(pending[i, j])))
+        return daily_logs, matches, incoming_likes
+
+    # Likes still pending at the end, attributed to their senders.
+    senders, sent_days = pending_likes_from_matrices(pending_w, pending_m, nw)
+    return finalize_aggregate_counters(
+        counters, senders, sent_days < num_days, num_days, totals[0], totals[1]
+    )
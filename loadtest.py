@@ -0,0 +1,267 @@
+"""
+Local load generator for the Flask app as deployed under gunicorn (see Procfile).
+
+Starts `gunicorn app:app` on localhost with the requested worker/thread model,
+drives concurrent simulation submissions with randomized parameters, and reports
+throughput, latency percentiles, error rates and per-worker peak RSS.
+
+Example:
+    python loadtest.py --workers 2 --threads 4 --worker-class gthread --concurrency 8 --requests 200
+"""
+import argparse
+import json
+import os
+import random
+import signal
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+
+##############################################################################
+# 1) GUNICORN PROCESS MANAGEMENT
+##############################################################################
+def start_server(port, workers, threads, worker_class, timeout):
+    """Launch gunicorn serving app:app on 127.0.0.1:port and return the Popen handle."""
+    cmd = [
+        sys.executable, "-m", "gunicorn", "app:app",
+        "--bind", f"127.0.0.1:{port}",
+        "--workers", str(workers),
+        "--threads", str(threads),
+        "--worker-class", worker_class,
+        "--timeout", str(timeout),
+        "--log-level", "warning",
+    ]
+    return subprocess.Popen(cmd, cwd=APP_DIR)
+
+def wait_until_ready(base_url, server, deadline=60):
+    """Poll the landing page until it answers, or fail if gunicorn exits first."""
+    start = time.time()
+    while time.time() - start < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"gunicorn exited with code {server.returncode}")
+        try:
+            with urllib.request.urlopen(base_url + "/", timeout=2) as resp:
+                if resp.status == 200:
+                    return
+        except (urllib.error.URLError, ConnectionError, OSError):
+            pass
+        time.sleep(0.5)
+    raise RuntimeError(f"server did not become ready within {deadline}s")
+
+def stop_server(server):
+    server.send_signal(signal.SIGTERM)
+    try:
+        server.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        server.kill()
+
+##############################################################################
+# 2) PER-WORKER MEMORY SAMPLING (LINUX /proc)
+##############################################################################
+def child_pids(parent_pid):
+    """PIDs whose parent is parent_pid (the gunicorn workers of a master)."""
+    pids = []
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                # Field 4 is the ppid; the command name in field 2 may contain spaces.
+                fields = f.read().rsplit(")", 1)[1].split()
+        except OSError:
+            continue
+        if int(fields[1]) == parent_pid:
+            pids.append(int(entry))
+    return pids
+
+def rss_mb(pid):
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024.0
+    except OSError:
+        pass
+    return None
+
+class RssSampler(threading.Thread):
+    """Background thread recording the peak RSS of every gunicorn worker it sees."""
+
+    def __init__(self, master_pid, interval=0.5):
+        super().__init__(daemon=True)
+        self.master_pid = master_pid
+        self.interval = interval
+        self.peak = {}
+        self._stop_event = threading.Event()
+
+    def run(self):
+        if not os.path.isdir("/proc"):
+            return
+        while not self._stop_event.is_set():
+            for pid in child_pids(self.master_pid):
+                mb = rss_mb(pid)
+                if mb is not None:
+                    self.peak[pid] = max(self.peak.get(pid, 0.0), mb)
+            self._stop_event.wait(self.interval)
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+##############################################################################
+# 3) REQUEST MIX AND CLIENTS
+##############################################################################
+def random_params(rng):
+    """A plausible form submission: weights in the ranges offered on the landing page."""
+    params = {
+        "weight_reciprocal": f"{rng.choice(range(0, 31)) / 10:.1f}",
+        "weight_queue_penalty": f"{rng.choice(range(0, 101)) / 100:.2f}",
+        "plot_type": rng.choice(["Bar Chart", "Histogram"]),
+    }
+    # Most users keep the default (checked) plot boxes.
+    if rng.random() < 0.8:
+        params["show_match_plots"] = "on"
+    if rng.random() < 0.8:
+        params["show_like_plots"] = "on"
+    return params
+
+def send_one(base_url, endpoint, params, timeout):
+    """Submit one simulation; returns (latency_seconds, ok, error_label)."""
+    start = time.perf_counter()
+    try:
+        if endpoint == "stream":
+            url = base_url + "/stream?" + urllib.parse.urlencode(params)
+            req = urllib.request.Request(url)
+        else:
+            req = urllib.request.Request(base_url + "/", data=urllib.parse.urlencode(params).encode())
+        with urllib.request.urlopen(req, timeout=timeout) as resp:
+            body = resp.read()
+            ok = resp.status == 200
+            if endpoint == "stream" and b"event: result" not in body:
+                return time.perf_counter() - start, False, "no result event"
+            return time.perf_counter() - start, ok, None if ok else f"HTTP {resp.status}"
+    except urllib.error.HTTPError as exc:
+        return time.perf_counter() - start, False, f"HTTP {exc.code}"
+    except Exception as exc:
+        return time.perf_counter() - start, False, type(exc).__name__
+
+def run_load(base_url, endpoint, concurrency, total_requests, duration, timeout, seed):
+    """Drive concurrent clients until total_requests are sent or duration elapses."""
+    results = []
+    lock = threading.Lock()
+    issued = [0]
+    deadline = time.time() + duration if duration else None
+
+    def client(idx):
+        rng = random.Random(seed + idx)
+        while True:
+            with lock:
+                if total_requests and issued[0] >= total_requests:
+                    return
+                if deadline and time.time() >= deadline:
+                    return
+                issued[0] += 1
+            outcome = send_one(base_url, endpoint, random_params(rng), timeout)
+            with lock:
+                results.append(outcome)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for idx in range(concurrency):
+            pool.submit(client, idx)
+    return results, time.perf_counter() - start
+
+##############################################################################
+# 4) REPORTING
+##############################################################################
+def summarize(results, elapsed, peak_rss, config):
+    latencies = np.array([lat for lat, ok, _ in results if ok])
+    errors = {}
+    for _, ok, label in results:
+        if not ok:
+            errors[label] = errors.get(label, 0) + 1
+    n = len(results)
+    report = {
+        "config": config,
+        "requests": n,
+        "succeeded": int(latencies.size),
+        "errors": errors,
+        "error_rate": (n - latencies.size) / n if n else 0.0,
+        "elapsed_s": elapsed,
+        "throughput_rps": latencies.size / elapsed if elapsed > 0 else 0.0,
+        "latency_ms": {},
+        "worker_peak_rss_mb": {str(pid): round(mb, 1) for pid, mb in sorted(peak_rss.items())},
+    }
+    if latencies.size:
+        for q in (50, 95, 99):
+            report["latency_ms"][f"p{q}"] = float(np.percentile(latencies, q) * 1000)
+        report["latency_ms"]["max"] = float(latencies.max() * 1000)
+    return report
+
+def print_report(report):
+    cfg = report["config"]
+    print(f"=== Load test: {cfg['workers']} worker(s) x {cfg['threads']} thread(s) "
+          f"[{cfg['worker_class']}], {cfg['concurrency']} concurrent client(s), endpoint={cfg['endpoint']} ===")
+    print(f"Requests: {report['requests']}  succeeded: {report['succeeded']}  "
+          f"error rate: {report['error_rate'] * 100:.2f}%")
+    for label, count in report["errors"].items():
+        print(f"  - {label}: {count}")
+    print(f"Elapsed: {report['elapsed_s']:.1f}s  throughput: {report['throughput_rps']:.2f} req/s")
+    if report["latency_ms"]:
+        lat = report["latency_ms"]
+        print(f"Latency (ms): p50={lat['p50']:.0f}  p95={lat['p95']:.0f}  p99={lat['p99']:.0f}  max={lat['max']:.0f}")
+    if report["worker_peak_rss_mb"]:
+        print("Peak RSS per worker (MB): " +
+              ", ".join(f"{pid}={mb}" for pid, mb in report["worker_peak_rss_mb"].items()))
+    else:
+        print("Peak RSS per worker: unavailable (needs Linux /proc)")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load-test app:app under a local gunicorn.")
+    parser.add_argument("--workers", type=int, default=1, help="gunicorn worker processes")
+    parser.add_argument("--threads", type=int, default=1, help="threads per worker")
+    parser.add_argument("--worker-class", default="sync", help="gunicorn worker class (sync, gthread, ...)")
+    parser.add_argument("--concurrency", type=int, default=4, help="concurrent simulated users")
+    parser.add_argument("--requests", type=int, default=50, help="total submissions (0 = unlimited)")
+    parser.add_argument("--duration", type=float, default=0, help="stop after this many seconds (0 = no limit)")
+    parser.add_argument("--endpoint", choices=["post", "stream"], default="post",
+                        help="submit via the form POST or the SSE /stream endpoint")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--timeout", type=float, default=120, help="client and gunicorn timeout (s)")
+    parser.add_argument("--seed", type=int, default=0, help="seed for the parameter mix")
+    parser.add_argument("--json", dest="json_out", help="also write the report to this JSON file")
+    args = parser.parse_args(argv)
+
+    if not args.requests and not args.duration:
+        parser.error("set --requests and/or --duration")
+
+    base_url = f"http://127.0.0.1:{args.port}"
+    server = start_server(args.port, args.workers, args.threads, args.worker_class, int(args.timeout))
+    try:
+        wait_until_ready(base_url, server)
+        sampler = RssSampler(server.pid)
+        sampler.start()
+        results, elapsed = run_load(base_url, args.endpoint, args.concurrency,
+                                    args.requests, args.duration, args.timeout, args.seed)
+        sampler.stop()
+    finally:
+        stop_server(server)
+
+    config = {k: getattr(args, k) for k in ("workers", "threads", "worker_class", "concurrency", "endpoint")}
+    report = summarize(results, elapsed, sampler.peak, config)
+    print_report(report)
+    if args.json_out:
+        with open(args.json_out, "w") as f:
+            json.dump(report, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,229 @@
+"""
+Successive-halving search over the recommendation weights.
+
+Instead of sweeping a full grid of (weight_reciprocal, weight_queue_penalty), sample a
+set of candidate settings, evaluate each with a few simulation replicates, keep the best
+fraction, give the survivors more replicates, and repeat. Replicates run in a process
+pool using run_dating_simulation(record="aggregate"). All candidates share the same
+replicate seeds (common random numbers), so comparisons are not swamped by noise.
+
+Example:
+    python optimizer.py --objective total_matches --candidates 27 --workers 4
+"""
+import argparse
+import math
+import random
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from backend import run_dating_simulation
+
+# Ranges offered on the landing page.
+WEIGHT_RECIPROCAL_RANGE = (0.0, 3.0)
+WEIGHT_QUEUE_RANGE = (0.0, 1.0)
+# Distinct settings after rounding like the form inputs (steps of 0.1 and 0.01).
+MAX_DISTINCT_CANDIDATES = 31 * 101
+
+##############################################################################
+# 1) OBJECTIVES
+##############################################################################
+def _users_with_match(counters):
+    return int((counters["matches"] > 0).sum())
+
+# name -> (metric computed from aggregate counters, True if larger is better)
+OBJECTIVES = {
+    "total_matches": (lambda c: c["total_matches"], True),
+    "users_with_match": (_users_with_match, True),
+    "stale_unseen": (lambda c: c["total_stale"], False),
+}
+
+# Two-sided 95% Student-t critical values by degrees of freedom (normal beyond 30).
+_T95 = [12.706, 4.303, 3.182, 2.776, 2.571, 2.447, 2.365, 2.306, 2.262, 2.228,
+        2.201, 2.179, 2.160, 2.145, 2.131, 2.120, 2.110, 2.101, 2.093, 2.086,
+        2.080, 2.074, 2.069, 2.064, 2.060, 2.056, 2.052, 2.048, 2.045, 2.042]
+
+def confidence_interval(values):
+    """Mean and 95% t-interval of a list of replicate values."""
+    values = np.asarray(values, dtype=float)
+    mean = float(values.mean())
+    if values.size < 2:
+        return mean, float("nan"), float("nan")
+    df = values.size - 1
+    t = _T95[df - 1] if df <= len(_T95) else 1.96
+    half = t * float(values.std(ddof=1)) / math.sqrt(values.size)
+    return mean, mean - half, mean + half
+
+##############################################################################
+# 2) ONE REPLICATE (RUNS IN A WORKER PROCESS)
+##############################################################################
+def _evaluate(task):
+    counters = run_dating_simulation(
+        num_days=task["num_days"],
+        daily_queue_size=task["daily_queue_size"],
+        weight_reciprocal=task["weight_reciprocal"],
+        weight_queue_penalty=task["weight_queue_penalty"],
+        random_seed=task["seed"],
+        record="aggregate"
+    )
+    row = dict(task)
+    for name, (metric, _) in OBJECTIVES.items():
+        row[name] = metric(counters)
+    return row
+
+##############################################################################
+# 3) SUCCESSIVE HALVING
+##############################################################################
+def sample_candidates(n, seed=0):
+    """n weight settings drawn uniformly from the allowed ranges, rounded like the form inputs."""
+    if not 1 <= n <= MAX_DISTINCT_CANDIDATES:
+        raise ValueError(f"n must be between 1 and {MAX_DISTINCT_CANDIDATES}, got {n}")
+    rng = random.Random(seed)
+    candidates = set()
+    while len(candidates) < n:
+        candidates.add((
+            round(rng.uniform(*WEIGHT_RECIPROCAL_RANGE), 1),
+            round(rng.uniform(*WEIGHT_QUEUE_RANGE), 2),
+        ))
+    return sorted(candidates)
+
+def optimize_weights(
+    objective="total_matches",
+    candidates=None,
+    n_candidates=27,
+    initial_replicates=2,
+    eta=3,
+    max_replicates=24,
+    num_days=3,
+    daily_queue_size=5,
+    base_seed=1000,
+    workers=None,
+    search_seed=0
+):
+    """
+    Searches (weight_reciprocal, weight_queue_penalty) for the best value of `objective`,
+    over `candidates` (deduplicated, within the form's ranges) or n_candidates sampled ones.
+
+    Each round evaluates every surviving candidate up to the round's replicate budget,
+    then keeps the top 1/eta of them (by mean objective) and multiplies the budget by eta,
+    until one candidate remains or the budget reaches max_replicates.
+
+    Returns a dict with:
+      - "best": the winning weights with mean objective and 95% confidence interval,
+      - "leaderboard": DataFrame of every candidate's final estimate,
+      - "log": DataFrame with one row per simulation run,
+      - "simulations": number of simulations run.
+    """
+    if objective not in OBJECTIVES:
+        raise ValueError(f"objective must be one of {sorted(OBJECTIVES)}, got {objective!r}")
+    if eta < 2:
+        raise ValueError(f"eta must be at least 2, got {eta}")
+    if initial_replicates < 1:
+        raise ValueError(f"initial_replicates must be at least 1, got {initial_replicates}")
+    if candidates is None and not 1 <= n_candidates <= MAX_DISTINCT_CANDIDATES:
+        raise ValueError(f"n_candidates must be between 1 and {MAX_DISTINCT_CANDIDATES}, got {n_candidates}")
+    _, maximize = OBJECTIVES[objective]
+    if candidates is None:
+        candidates = sample_candidates(n_candidates, search_seed)
+    # Duplicates would share replicate seeds and pass as extra replicates.
+    candidates = list(dict.fromkeys(tuple(c) for c in candidates))
+    if not candidates:
+        raise ValueError("candidates must not be empty")
+    for w_rec, w_queue in candidates:
+        if not (WEIGHT_RECIPROCAL_RANGE[0] <= w_rec <= WEIGHT_RECIPROCAL_RANGE[1]
+                and WEIGHT_QUEUE_RANGE[0] <= w_queue <= WEIGHT_QUEUE_RANGE[1]):
+            raise ValueError(f"candidate {(w_rec, w_queue)} is outside the allowed weight ranges "
+                             f"{WEIGHT_RECIPROCAL_RANGE} x {WEIGHT_QUEUE_RANGE}")
+
+    results = {c: [] for c in candidates}   # candidate -> objective value per replicate
+    log_rows = []
+    survivors = list(candidates)
+    budget = initial_replicates
+    round_no = 0
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        while True:
+            round_no += 1
+            tasks = []
+            for w_rec, w_queue in survivors:
+                for rep in range(len(results[(w_rec, w_queue)]), budget):
+                    tasks.append({
+                        "round": round_no,
+                        "weight_reciprocal": w_rec,
+                        "weight_queue_penalty": w_queue,
+                        "replicate": rep,
+                        "seed": base_seed + rep,
+                        "num_days": num_days,
+                        "daily_queue_size": daily_queue_size,
+                    })
+            for row in pool.map(_evaluate, tasks):
+                results[(row["weight_reciprocal"], row["weight_queue_penalty"])].append(row[objective])
+                log_rows.append(row)
+
+            if len(survivors) == 1 or budget >= max_replicates:
+                break
+            ranked = sorted(survivors, key=lambda c: np.mean(results[c]), reverse=maximize)
+            survivors = ranked[:max(1, len(survivors) // eta)]
+            budget = min(budget * eta, max_replicates)
+
+    leaderboard = []
+    for (w_rec, w_queue), values in results.items():
+        mean, low, high = confidence_interval(values)
+        leaderboard.append({
+            "weight_reciprocal": w_rec,
+            "weight_queue_penalty": w_queue,
+            "replicates": len(values),
+            "mean": mean,
+            "ci_low": low,
+            "ci_high": high,
+            "finalist": (w_rec, w_queue) in survivors,
+        })
+    leaderboard = pd.DataFrame(leaderboard).sort_values(
+        ["finalist", "mean"], ascending=[False, not maximize]
+    ).reset_index(drop=True)
+
+    return {
+        "objective": objective,
+        "best": leaderboard.iloc[0].to_dict(),
+        "leaderboard": leaderboard,
+        "log": pd.DataFrame(log_rows),
+        "simulations": len(log_rows),
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Search recommendation weights by successive halving.")
+    parser.add_argument("--objective", choices=sorted(OBJECTIVES), default="total_matches")
+    parser.add_argument("--candidates", type=int, default=27, help="number of sampled weight settings")
+    parser.add_argument("--initial-replicates", type=int, default=2)
+    parser.add_argument("--eta", type=int, default=3, help="keep 1/eta of candidates per round")
+    parser.add_argument("--max-replicates", type=int, default=24)
+    parser.add_argument("--num-days", type=int, default=3)
+    parser.add_argument("--daily-queue-size", type=int, default=5)
+    parser.add_argument("--workers", type=int, default=None, help="process pool size (default: CPU count)")
+    parser.add_argument("--seed", type=int, default=0, help="seed for sampling candidates")
+    parser.add_argument("--log-out", help="write the per-simulation evaluation log to this CSV")
+    args = parser.parse_args(argv)
+
+    result = optimize_weights(
+        objective=args.objective,
+        n_candidates=args.candidates,
+        initial_replicates=args.initial_replicates,
+        eta=args.eta,
+        max_replicates=args.max_replicates,
+        num_days=args.num_days,
+        daily_queue_size=args.daily_queue_size,
+        workers=args.workers,
+        search_seed=args.seed
+    )
+    best = result["best"]
+    print(f"=== Best weights for {result['objective']} after {result['simulations']} simulations ===")
+    print(f"w_reciprocal={best['weight_reciprocal']}, w_queue={best['weight_queue_penalty']}: "
+          f"{best['mean']:.2f} (95% CI {best['ci_low']:.2f} to {best['ci_high']:.2f}, "
+          f"{best['replicates']} replicates)")
+    print(result["leaderboard"].head(10).to_string(index=False))
+    if args.log_out:
+        result["log"].to_csv(args.log_out, index=False)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,216 @@
+"""
+Event-driven, continuous-time variant of the dating simulation.
+
+Instead of every user logging in exactly once per day in a shuffled order, each user
+logs in as a Poisson process with their own rate (logins per day). Login events sit in
+a priority queue ordered by timestamp, so only users who actually log in cost anything:
+work scales with the number of sessions, not users x days. Users with rate 0 are
+never scheduled.
+
+Each session follows the same rules as run_dating_simulation: score the unseen,
+unmatched pool (incoming likes by P_ij, fresh candidates by the queue-penalized,
+reciprocal-weighted score), take the top daily_queue_size, roll, update queues and
+matches. Likes carry real timestamps, so delays and staleness are measured in days
+elapsed rather than by day number.
+
+Example:
+    counters = run_event_simulation(horizon_days=300, activity_rates=gamma_activity_rates(shape=0.5))
+"""
+import heapq
+
+import numpy as np
+
+from backend import (
+    all_women_ids, all_men_ids, all_user_ids,
+    make_market, new_aggregate_counters, finalize_aggregate_counters,
+    pending_likes_from_matrices, progress_metrics
+)
+
+##############################################################################
+# 1) ACTIVITY RATES
+##############################################################################
+def gamma_activity_rates(mean=1.0, shape=1.0, seed=0, user_ids=None):
+    """
+    Heterogeneous login rates (logins/day) drawn from a Gamma distribution with the given
+    mean; smaller shape means a longer tail of rarely-active users.
+    """
+    user_ids = all_user_ids if user_ids is None else user_ids
+    rng = np.random.default_rng(seed)
+    rates = rng.gamma(shape, mean / shape, size=len(user_ids))
+    return dict(zip(user_ids, rates))
+
+def _rates_array(activity_rates, user_ids):
+    if activity_rates is None:
+        return np.ones(len(user_ids))
+    if np.isscalar(activity_rates):
+        return np.full(len(user_ids), float(activity_rates))
+    if isinstance(activity_rates, dict):
+        return np.array([float(activity_rates.get(uid, 0.0)) for uid in user_ids])
+    rates = np.asarray(activity_rates, dtype=float)
+    if rates.shape != (len(user_ids),):
+        raise ValueError(f"activity_rates must have one entry per user ({len(user_ids)})")
+    return rates
+
+##############################################################################
+# 2) THE EVENT LOOP
+##############################################################################
+def run_event_simulation(
+    horizon_days=30.0,
+    activity_rates=None,
+    daily_queue_size=5,
+    weight_reciprocal=1.0,
+    weight_queue_penalty=0.5,
+    stale_after=1.0,
+    random_seed=42,
+    progress_callback=None,
+    market=None
+):
+    """
+    Simulates login sessions in continuous time over [0, horizon_days).
+
+    activity_rates: None (1 login/day for everyone), a scalar, a dict uid -> rate, or an
+    array aligned with the market's users (women first). A pending like counts as stale at
+    the end if it has waited longer than stale_after days. market restricts the run to a
+    sub-market, as in run_dating_simulation.
+
+    Returns counters in the record="aggregate" format of run_dating_simulation. There,
+    delay_total stays int64: whole days between the day numbers (floor(t) + 1) at which a
+    like was sent and seen, as in the daily engine. The exact elapsed time goes in the
+    extra float64 field "delay_days" ("total_delay_days"). Also adds "sessions" (per user)
+    and "total_sessions". progress_callback, if given, receives the same running metrics
+    at every whole-day boundary.
+    """
+    if market is None:
+        market = make_market(all_women_ids, all_men_ids)
+    women_ids, men_ids = market["women_ids"], market["men_ids"]
+    rng = np.random.default_rng(random_seed)
+    user_ids = women_ids + men_ids
+    nw, nm = len(women_ids), len(men_ids)
+    n = nw + nm
+    rates = _rates_array(activity_rates, user_ids)
+
+    # prob_w[i, j] = P(woman i likes man j); prob_m[j, i] = P(man j likes woman i)
+    prob_w = market["prob_women_likes_men"].loc[women_ids, men_ids].to_numpy(dtype=np.float64)
+    prob_m = market["prob_men_likes_women"].loc[men_ids, women_ids].to_numpy(dtype=np.float64)
+
+    # Side-local state, indexed [own, other]; matched is [woman, man].
+    seen_w = np.zeros((nw, nm), dtype=bool)
+    seen_m = np.zeros((nm, nw), dtype=bool)
+    matched = np.zeros((nw, nm), dtype=bool)
+    liked_w = np.zeros((nw, nm), dtype=bool)
+    liked_m = np.zeros((nm, nw), dtype=bool)
+    pending_w = np.full((nw, nm), np.nan)   # time man j's pending like to woman i was sent
+    pending_m = np.full((nm, nw), np.nan)
+    queue_len = np.zeros(n, dtype=np.int64)
+
+    counters = new_aggregate_counters(user_ids)
+    views, delay_total = counters["views"], counters["delay_total"]
+    likes_sent, likes_received = counters["likes_sent"], counters["likes_received"]
+    match_counts = counters["matches"]
+    delay_days = np.zeros(n, dtype=np.float64)
+    sessions = np.zeros(n, dtype=np.int64)
+    total_likes = 0
+    total_matches = 0
+
+    # Priority queue of (login time, user index); inactive users are never pushed.
+    events = []
+    for u in np.flatnonzero(rates > 0):
+        t = rng.exponential(1.0 / rates[u])
+        if t < horizon_days:
+            events.append((t, int(u)))
+    heapq.heapify(events)
+
+    next_day = 1
+
+    def report(day):
+        progress_callback(progress_metrics(
+            day, np.ceil(horizon_days), total_likes, total_matches, queue_len, nw
+        ))
+
+    while events:
+        t, u = heapq.heappop(events)
+        while progress_callback is not None and t >= next_day:
+            report(next_day)
+            next_day += 1
+
+        is_woman = u < nw
+        own = u if is_woman else u - nw
+        if is_woman:
+            pool = np.flatnonzero(~matched[own] & ~seen_w[own])
+            p, r, sent = prob_w[own, pool], prob_m[pool, own], pending_w[own, pool]
+            cand_ids = nw + pool
+        else:
+            pool = np.flatnonzero(~matched[:, own] & ~seen_m[own])
+            p, r, sent = prob_m[own, pool], prob_w[pool, own], pending_m[own, pool]
+            cand_ids = pool
+
+        incoming = ~np.isnan(sent)
+        fresh_score = p * (1 / (1 + weight_queue_penalty * queue_len[cand_ids])) * (r ** weight_reciprocal)
+        score = np.where(incoming, p, fresh_score)
+        # Stable sort keeps pool order on ties, as in the daily engine.
+        chosen = np.argsort(-score, kind="stable")[:daily_queue_size]
+        rolls = rng.random(len(chosen))
+
+        for c, roll in zip(chosen, rolls):
+            j, cand = pool[c], cand_ids[c]
+            if incoming[c]:
+                if is_woman:
+                    pending_w[own, j] = np.nan
+                else:
+                    pending_m[own, j] = np.nan
+                queue_len[u] -= 1
+                delay_days[u] += t - sent[c]
+                delay_total[u] += int(np.floor(t) - np.floor(sent[c]))
+
+            if roll < p[c]:
+                total_likes += 1
+                likes_sent[u] += 1
+                likes_received[cand] += 1
+                if (liked_m[j, own] if is_woman else liked_w[j, own]):
+                    total_matches += 1
+                    match_counts[u] += 1
+                    match_counts[cand] += 1
+                    if is_woman:
+                        matched[own, j] = True
+                    else:
+                        matched[j, own] = True
+                else:
+                    if is_woman:
+                        liked_w[own, j] = True
+                    else:
+                        liked_m[own, j] = True
+                    if not incoming[c]:
+                        if is_woman:
+                            pending_m[j, own] = t
+                        else:
+                            pending_w[j, own] = t
+                        queue_len[cand] += 1
+
+            views[u] += 1
+            if is_woman:
+                seen_w[own, j] = True
+            else:
+                seen_m[own, j] = True
+
+        sessions[u] += 1
+        t_next = t + rng.exponential(1.0 / rates[u])
+        if t_next < horizon_days:
+            heapq.heappush(events, (t_next, u))
+
+    while progress_callback is not None and next_day <= np.ceil(horizon_days):
+        report(next_day)
+        next_day += 1
+
+    # Likes still pending at the horizon, attributed to their senders.
+    senders, sent_times = pending_likes_from_matrices(pending_w, pending_m, nw, empty=np.nan)
+    finalize_aggregate_counters(
+        counters, senders, horizon_days - sent_times > stale_after,
+        int(np.ceil(horizon_days)), total_likes, total_matches
+    )
+    counters["delay_days"] = delay_days
+    counters["total_delay_days"] = float(delay_days.sum())
+    counters["sessions"] = sessions
+    counters["total_sessions"] = int(sessions.sum())
+    counters["horizon_days"] = horizon_days
+    counters["stale_after"] = stale_after
+    return counters
@@ -0,0 +1,440 @@
+"""
+Sharded simulation of independent sub-markets.
+
+Users are partitioned into sub-markets, either by a profile attribute shared by both
+profile CSVs (e.g. "Education", "Dating Intentions") or by an explicit uid -> shard
+mapping. Each shard gets its own sliced probability matrices (backend.make_market) and
+runs run_dating_simulation(record="aggregate") in a separate worker process. Per-shard
+counters are merged back into one set of counters in the global user order, so
+app.build_results can render them like a single run.
+
+Workers are either a local process pool, or any number of processes (on this or other
+hosts) sharing a work-queue directory, e.g. on a network filesystem:
+
+    python sharding.py worker --queue /shared/simq            # on each host
+    python sharding.py run --by Education --queue /shared/simq
+
+Tasks and results are pickled; only share the queue directory between trusted hosts.
+"""
+import argparse
+import atexit
+import glob
+import multiprocessing
+import os
+import pickle
+import socket
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
+
+from backend import (
+    women_df, men_df, all_user_ids,
+    make_market, new_aggregate_counters, run_dating_simulation, AGGREGATE_FIELDS
+)
+
+##############################################################################
+# 1) PARTITIONING
+##############################################################################
+def shardable_attributes():
+    """Profile columns present for both women and men (valid values for `by`)."""
+    return [c for c in women_df.columns if c in men_df.columns]
+
+def partition_users(by=None, mapping=None):
+    """
+    Returns {shard label: (women_ids, men_ids)}, keeping the global id order within shards.
+    Exactly one of `by` (a profile column) or `mapping` (uid -> shard label) is required.
+    """
+    if (by is None) == (mapping is None):
+        raise ValueError("pass exactly one of by= or mapping=")
+    if by is not None:
+        if by not in shardable_attributes():
+            raise ValueError(f"cannot shard by {by!r}; choose from {shardable_attributes()}")
+        mapping = dict(zip(women_df["WomanID"], women_df[by]))
+        mapping.update(zip(men_df["ManID"], men_df[by]))
+    missing = [uid for uid in all_user_ids if uid not in mapping]
+    if missing:
+        raise ValueError(f"mapping has no shard for {len(missing)} user(s), e.g. {missing[0]}")
+
+    shards = {}
+    for uid in all_user_ids:
+        women, men = shards.setdefault(mapping[uid], ([], []))
+        (women if uid.startswith("W") else men).append(uid)
+    return shards
+
+def build_shard_tasks(shards, random_seed=42, **sim_kwargs):
+    """One picklable task per shard; shards get distinct seeds derived from random_seed."""
+    tasks = []
+    for idx, (label, (women, men)) in enumerate(sorted(shards.items(), key=lambda kv: str(kv[0]))):
+        tasks.append({
+            "task_id": uuid.uuid4().hex,
+            "shard": label,
+            "market": make_market(women, men),
+            "kwargs": dict(sim_kwargs, random_seed=random_seed + idx),
+        })
+    return tasks
+
+def run_shard(task):
+    """Run one shard (in whichever process picks it up) and return its counters."""
+    counters = run_dating_simulation(record="aggregate", market=task["market"], **task["kwargs"])
+    return {"task_id": task["task_id"], "shard": task["shard"], "counters": counters}
+
+##############################################################################
+# 2) MERGING
+##############################################################################
+def merge_counters(results):
+    """
+    Merge per-shard aggregate counters into one set over all_user_ids (users outside every
+    shard keep zeros). Adds "shards": {label: headline totals} for per-market reporting.
+    """
+    merged = new_aggregate_counters(all_user_ids)
+    index = {uid: i for i, uid in enumerate(all_user_ids)}
+    totals = ["total_views", "total_likes", "total_matches", "total_delay", "total_unseen", "total_stale"]
+    for key in totals:
+        merged[key] = 0
+    merged["shards"] = {}
+
+    for result in results:
+        counters = result["counters"]
+        pos = np.array([index[uid] for uid in counters["user_ids"]], dtype=np.int64)
+        for field in AGGREGATE_FIELDS:
+            merged[field][pos] += counters[field]
+        for key in totals:
+            merged[key] += counters[key]
+        merged["num_days"] = counters["num_days"]
+        merged["shards"][result["shard"]] = {
+            "users": len(counters["user_ids"]),
+            **{key: counters[key] for key in totals},
+        }
+    return merged
+
+##############################################################################
+# 3) FILE WORK QUEUE (MULTI-HOST)
+##############################################################################
+# Workers refresh the mtime of a claimed task this often while running it; a claim not
+# refreshed for longer than the lease is treated as abandoned and put back in pending/.
+HEARTBEAT_SECONDS = 10
+DEFAULT_LEASE_SECONDS = 60
+
+class ShardFailed(RuntimeError):
+    """A shard raised in its worker; the message carries the worker's traceback."""
+
+class FileWorkQueue:
+    """
+    A work queue in a shared directory. Tasks are files in pending/; a worker claims one by
+    atomically renaming it into claimed/ (as <host>-<pid>-<task_id>.pkl), and publishes its
+    result, or the error it raised, into done/ via a temp-file rename, so readers never see
+    partial files.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        for sub in ("pending", "claimed", "done"):
+            os.makedirs(os.path.join(directory, sub), exist_ok=True)
+
+    def _path(self, sub, name):
+        return os.path.join(self.directory, sub, name)
+
+    def _write(self, sub, name, obj):
+        tmp = self._path(sub, f".{name}.{uuid.uuid4().hex}.tmp")
+        with open(tmp, "wb") as f:
+            pickle.dump(obj, f)
+        os.replace(tmp, self._path(sub, name))
+
+    def _claims(self):
+        """(task_id, path) for every claimed task; task ids are hex, so the last '-' splits."""
+        for path in glob.glob(self._path("claimed", "*.pkl")):
+            yield os.path.basename(path).rsplit("-", 1)[-1][:-len(".pkl")], path
+
+    def submit(self, tasks):
+        for task in tasks:
+            self._write("pending", f"{task['task_id']}.pkl", task)
+        return [task["task_id"] for task in tasks]
+
+    def claim(self):
+        """Claim and return (task, claimed path) for one pending task, or None if there is none."""
+        for path in sorted(glob.glob(self._path("pending", "*.pkl"))):
+            name = os.path.basename(path)
+            claimed = self._path("claimed", f"{socket.gethostname()}-{os.getpid()}-{name}")
+            try:
+                os.rename(path, claimed)
+                # rename keeps the submit-time mtime; start the lease now.
+                os.utime(claimed)
+                with open(claimed, "rb") as f:
+                    return pickle.load(f), claimed
+            except FileNotFoundError:
+                continue  # another worker got it first, or it was requeued meanwhile
+        return None
+
+    def complete(self, result, claimed_path):
+        """
+        Publish result, unless the claim was taken away meanwhile: its lease expired and the
+        task was requeued, or the submitter stopped waiting and discarded it. Returns whether
+        the result was written, so abandoned tasks leave nothing behind in done/.
+        """
+        try:
+            os.remove(claimed_path)
+        except FileNotFoundError:
+            return False
+        self._write("done", f"{result['task_id']}.pkl", result)
+        return True
+
+    def requeue_stale(self, task_ids=None, lease=DEFAULT_LEASE_SECONDS):
+        """Move claims not refreshed within `lease` seconds back to pending/; returns their ids."""
+        requeued = []
+        cutoff = time.time() - lease
+        for task_id, path in self._claims():
+            if task_ids is not None and task_id not in task_ids:
+                continue
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    os.rename(path, self._path("pending", f"{task_id}.pkl"))
+                    requeued.append(task_id)
+            except FileNotFoundError:
+                pass
+        return requeued
+
+    def discard(self, task_ids):
+        """Remove every pending, claimed and finished file belonging to task_ids."""
+        task_ids = set(task_ids)
+        paths = [self._path(sub, f"{task_id}.pkl") for task_id in task_ids for sub in ("pending", "done")]
+        paths += [path for task_id, path in self._claims() if task_id in task_ids]
+        for path in paths:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def collect(self, task_ids, timeout=None, poll_interval=0.5, lease=DEFAULT_LEASE_SECONDS,
+                on_result=None, cancel_check=None):
+        """
+        Wait for (and remove) the results of task_ids, requeueing claims whose worker went
+        quiet for longer than `lease`. on_result(result) is called as each one arrives.
+        Raises ShardFailed if a shard raised, TimeoutError if results don't arrive in time;
+        cancel_check() may raise to stop waiting. In every such case this run's leftover
+        pending/claimed/done files are removed.
+        """
+        results, remaining = {}, set(task_ids)
+        deadline = None if timeout is None else time.time() + timeout
+        try:
+            while remaining:
+                for task_id in list(remaining):
+                    path = self._path("done", f"{task_id}.pkl")
+                    if not os.path.exists(path):
+                        continue
+                    with open(path, "rb") as f:
+                        result = pickle.load(f)
+                    os.remove(path)
+                    remaining.discard(task_id)
+                    if "error" in result:
+                        raise ShardFailed(
+                            f"shard {result['shard']!r} failed on {result['worker']}:\n{result['error']}"
+                        )
+                    results[task_id] = result
+                    if on_result is not None:
+                        on_result(result)
+                if remaining:
+                    if cancel_check is not None:
+                        cancel_check()
+                    if deadline is not None and time.time() > deadline:
+                        raise TimeoutError(f"{len(remaining)} shard(s) did not finish in time")
+                    self.requeue_stale(remaining, lease)
+                    time.sleep(poll_interval)
+        except BaseException:
+            self.discard(remaining)
+            raise
+        return [results[task_id] for task_id in task_ids]
+
+def _heartbeat(path, stop):
+    while not stop.wait(HEARTBEAT_SECONDS):
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return
+
+def serve_queue(directory, idle_exit=0, poll_interval=0.5):
+    """
+    Worker loop: run tasks from the queue until idle for idle_exit seconds (0 = forever).
+    A shard that raises is reported back as an error result instead of killing the worker.
+    """
+    work_queue = FileWorkQueue(directory)
+    idle_since = time.time()
+    while True:
+        claimed = work_queue.claim()
+        if claimed is None:
+            if idle_exit and time.time() - idle_since > idle_exit:
+                return
+            time.sleep(poll_interval)
+            continue
+        task, path = claimed
+        stop = threading.Event()
+        heartbeat = threading.Thread(target=_heartbeat, args=(path, stop), daemon=True)
+        heartbeat.start()
+        try:
+            result = run_shard(task)
+        except Exception:
+            result = {
+                "task_id": task["task_id"],
+                "shard": task["shard"],
+                "worker": f"{socket.gethostname()}:{os.getpid()}",
+                "error": traceback.format_exc(),
+            }
+        finally:
+            stop.set()
+            heartbeat.join()
+        work_queue.complete(result, path)
+        idle_since = time.time()
+
+##############################################################################
+# 4) SHARED LOCAL PROCESS POOL
+##############################################################################
+# How often a waiting local run checks cancel_check between shard completions.
+CANCEL_POLL_SECONDS = 0.5
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def shard_pool(workers=None):
+    """
+    The process pool local shards run in, created on first use and reused by every later
+    run in this process (e.g. all requests served by one web worker), then shut down at
+    exit. Each pool process imports backend once (~100 MB), so `workers` caps the memory
+    cost; it only takes effect when the pool is created (default: CPU count).
+    Uses "spawn", which is safe when the first run starts from a thread of a server process.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=workers or os.cpu_count() or 1,
+                                        mp_context=multiprocessing.get_context("spawn"))
+        return _pool
+
+def _discard_pool(pool):
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+@atexit.register
+def _shutdown_pool():
+    if _pool is not None:
+        _discard_pool(_pool)
+
+def _run_local(tasks, workers, on_result, cancel_check):
+    """
+    Run tasks in the shared pool, calling on_result as shards finish and cancel_check while
+    waiting. If either raises, this run's queued shards are cancelled; shards already
+    running finish in the background and their results are dropped. A pool broken by a
+    crashed process is replaced on the next run.
+    """
+    pool = shard_pool(workers)
+    pending = {pool.submit(run_shard, task) for task in tasks}
+    results = []
+    try:
+        while pending:
+            done, pending = wait(pending, timeout=CANCEL_POLL_SECONDS, return_when=FIRST_COMPLETED)
+            for future in done:
+                results.append(future.result())
+                on_result(results[-1])
+            if pending and cancel_check is not None:
+                cancel_check()
+    except BrokenProcessPool:
+        _discard_pool(pool)
+        raise
+    finally:
+        for future in pending:
+            future.cancel()
+    return results
+
+##############################################################################
+# 5) ENTRY POINT
+##############################################################################
+def run_sharded_simulation(by=None, mapping=None, workers=None, queue_dir=None, timeout=None,
+                           lease=DEFAULT_LEASE_SECONDS, random_seed=42,
+                           progress_callback=None, cancel_check=None, **sim_kwargs):
+    """
+    Partition users, run every shard in its own worker process and merge the results.
+
+    Shards run in the shared local process pool (see shard_pool; workers sizes it when a
+    run first creates it) unless queue_dir is given, in which case tasks are posted to a
+    FileWorkQueue there and picked up by `python sharding.py worker` processes; a shard
+    whose worker stops heart-beating for `lease` seconds is handed to another worker.
+    Remaining keyword arguments go to run_dating_simulation (record is always "aggregate").
+
+    progress_callback, if given, is called as each shard finishes with the shard label and
+    running totals; cancel_check is called while waiting. Either may raise (e.g.
+    SimulationCancelled) to abandon the run: queued shards are dropped, not started.
+    """
+    if "record" in sim_kwargs:
+        raise ValueError("sharded runs always use record='aggregate'")
+    tasks = build_shard_tasks(partition_users(by=by, mapping=mapping), random_seed=random_seed, **sim_kwargs)
+    finished = []
+
+    def on_result(result):
+        finished.append(result["counters"])
+        if progress_callback is not None:
+            progress_callback({
+                "shard": str(result["shard"]),
+                "shards_done": len(finished),
+                "shards_total": len(tasks),
+                "likes": sum(c["total_likes"] for c in finished),
+                "matches": sum(c["total_matches"] for c in finished),
+                "pending_likes": sum(c["total_unseen"] for c in finished),
+            })
+
+    if queue_dir is not None:
+        work_queue = FileWorkQueue(queue_dir)
+        results = work_queue.collect(work_queue.submit(tasks), timeout=timeout, lease=lease,
+                                     on_result=on_result, cancel_check=cancel_check)
+    else:
+        results = _run_local(tasks, workers, on_result, cancel_check)
+        order = {task["task_id"]: i for i, task in enumerate(tasks)}
+        results.sort(key=lambda result: order[result["task_id"]])
+    return merge_counters(results)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Sharded simulation of independent sub-markets.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    run = sub.add_parser("run", help="partition, run shards and print the merged totals")
+    run.add_argument("--by", default="Education", help="profile attribute to shard by")
+    run.add_argument("--workers", type=int, default=None, help="local process pool size")
+    run.add_argument("--queue", help="post tasks to this work-queue directory instead of a local pool")
+    run.add_argument("--timeout", type=float, default=None, help="seconds to wait for queued shards")
+    run.add_argument("--num-days", type=int, default=3)
+    run.add_argument("--daily-queue-size", type=int, default=5)
+    run.add_argument("--weight-reciprocal", type=float, default=1.0)
+    run.add_argument("--weight-queue-penalty", type=float, default=0.5)
+    run.add_argument("--engine", choices=["python", "jit"], default="python")
+    run.add_argument("--seed", type=int, default=42)
+
+    worker = sub.add_parser("worker", help="serve shard tasks from a work-queue directory")
+    worker.add_argument("--queue", required=True)
+    worker.add_argument("--idle-exit", type=float, default=0, help="exit after this many idle seconds (0 = never)")
+
+    args = parser.parse_args(argv)
+    if args.command == "worker":
+        serve_queue(args.queue, idle_exit=args.idle_exit)
+        return
+
+    start = time.time()
+    merged = run_sharded_simulation(
+        by=args.by, workers=args.workers, queue_dir=args.queue, timeout=args.timeout,
+        random_seed=args.seed, num_days=args.num_days, daily_queue_size=args.daily_queue_size,
+        weight_reciprocal=args.weight_reciprocal, weight_queue_penalty=args.weight_queue_penalty,
+        engine=args.engine
+    )
+    print(f"=== {len(merged['shards'])} sub-markets by {args.by} ({time.time() - start:.1f}s) ===")
+    for label, shard in merged["shards"].items():
+        print(f"{label}: {shard['users']} users, {shard['total_likes']} likes, "
+              f"{shard['total_matches']} matches, {shard['total_stale']} stale unseen likes")
+    print(f"Total: {merged['total_views']} views, {merged['total_likes']} likes, "
+          f"{merged['total_matches']} matches, {merged['total_stale']} stale unseen likes")
+
+if __name__ == "__main__":
+    main()